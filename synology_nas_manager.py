@@ -1,18 +1,203 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ConnectTimeoutError
 import json
 import threading
 import os
 import sys
-from urllib.parse import quote, urljoin
+from urllib.parse import quote, urljoin, urlparse
 import time
+import math
+import random
+import re
+import bisect
 from datetime import datetime
 import configparser
+import csv
 import base64
 from cryptography.fernet import Fernet
 import hashlib
 import tempfile
+import uuid
+import weakref
+import struct
+import zlib
+import stat
+import select
+import ctypes
+import ctypes.util
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# 传输校验不一致时的最大重试次数
+MAX_VERIFY_RETRIES = 2
+
+# 批量上传：默认/最大并发数，以及单个文件网络错误时的重试次数
+DEFAULT_UPLOAD_PARALLELISM = 3
+MAX_UPLOAD_PARALLELISM = 8
+UPLOAD_RETRIES = 2
+
+# 文件夹上传时每次CreateFolder请求最多创建的文件夹数
+CREATE_FOLDER_BATCH = 100
+
+# 客户端实现所对应的各API最高版本，实际使用时再与NAS报告的版本范围协商
+API_VERSIONS = {
+    'SYNO.API.Auth': 7,
+    'SYNO.DSM.Info': 2,
+    'SYNO.FileStation.Info': 2,
+    'SYNO.FileStation.List': 2,
+    'SYNO.FileStation.Upload': 3,
+    'SYNO.FileStation.Download': 2,
+    'SYNO.FileStation.MD5': 2,
+    'SYNO.FileStation.CreateFolder': 2,
+}
+API_INFO_QUERY = ','.join(API_VERSIONS)
+
+# API信息缓存的有效期（秒），DSM版本变化时也会提前失效
+API_INFO_TTL = 7 * 24 * 3600
+
+# SYNO.API.Auth登录错误码。出现这些错误说明API本身可用，不必重新查询API信息
+LOGIN_ERROR_MESSAGES = {
+    400: "账号或密码错误",
+    401: "账号已被禁用",
+    402: "权限不足",
+    403: "需要双重验证",
+    404: "双重验证码错误"
+}
+
+# 会话保活：空闲超过HEARTBEAT_INTERVAL秒后发送心跳，每HEARTBEAT_CHECK_INTERVAL秒检查一次
+HEARTBEAT_INTERVAL = 300
+HEARTBEAT_CHECK_INTERVAL = 30
+
+# 文件列表分页大小；文件夹超过SERVER_LISTING_THRESHOLD项时改由NAS排序、筛选并按页加载
+LISTING_PAGE_SIZE = 5000
+SERVER_LISTING_THRESHOLD = 20000
+
+# 目录树：展开时最多探测多少个子文件夹是否还有下级（超出的仍显示展开箭头），以及探测并发数。
+# 每个探测都是一次请求，只探测大致一屏可见的数量
+TREE_PROBE_LIMIT = 32
+TREE_PROBE_PARALLELISM = 4
+
+# 文件类型映射 - 使用简单的文本标识避免emoji兼容性问题
+FILE_TYPE_LABELS = {
+    # 图片
+    '.png': '[图片] PNG',
+    '.jpg': '[图片] JPG', 
+    '.jpeg': '[图片] JPEG',
+    '.gif': '[图片] GIF',
+    '.bmp': '[图片] BMP',
+    '.svg': '[图片] SVG',
+    '.webp': '[图片] WebP',
+    '.ico': '[图片] ICO',
+    
+    # 文档
+    '.txt': '[文本] TXT',
+    '.doc': '[Word] DOC',
+    '.docx': '[Word] DOCX',
+    '.pdf': '[PDF] PDF',
+    '.xls': '[Excel] XLS',
+    '.xlsx': '[Excel] XLSX',
+    '.ppt': '[PPT] PPT',
+    '.pptx': '[PPT] PPTX',
+    '.rtf': '[文本] RTF',
+    '.odt': '[文档] ODT',
+    '.ods': '[表格] ODS',
+    '.odp': '[演示] ODP',
+    
+    # 代码和脚本
+    '.py': '[代码] Python',
+    '.js': '[代码] JavaScript',
+    '.html': '[网页] HTML',
+    '.htm': '[网页] HTM',
+    '.css': '[样式] CSS',
+    '.php': '[代码] PHP',
+    '.java': '[代码] Java',
+    '.cpp': '[代码] C++',
+    '.c': '[代码] C',
+    '.cs': '[代码] C#',
+    '.xml': '[数据] XML',
+    '.json': '[数据] JSON',
+    '.sql': '[数据库] SQL',
+    '.sh': '[脚本] Shell',
+    '.bat': '[脚本] BAT',
+    '.ps1': '[脚本] PowerShell',
+    
+    # 压缩包
+    '.zip': '[压缩] ZIP',
+    '.rar': '[压缩] RAR',
+    '.7z': '[压缩] 7Z',
+    '.tar': '[压缩] TAR',
+    '.gz': '[压缩] GZ',
+    '.bz2': '[压缩] BZ2',
+    '.xz': '[压缩] XZ',
+    
+    # 音频
+    '.mp3': '[音频] MP3',
+    '.wav': '[音频] WAV',
+    '.flac': '[音频] FLAC',
+    '.aac': '[音频] AAC',
+    '.ogg': '[音频] OGG',
+    '.wma': '[音频] WMA',
+    
+    # 视频
+    '.mp4': '[视频] MP4',
+    '.avi': '[视频] AVI',
+    '.mkv': '[视频] MKV',
+    '.mov': '[视频] MOV',
+    '.wmv': '[视频] WMV',
+    '.flv': '[视频] FLV',
+    '.webm': '[视频] WebM',
+    '.m4v': '[视频] M4V',
+    
+    # 可执行文件
+    '.exe': '[程序] EXE',
+    '.msi': '[安装] MSI',
+    '.deb': '[安装] DEB',
+    '.rpm': '[安装] RPM',
+    '.dmg': '[安装] DMG',
+    '.app': '[应用] APP',
+    
+    # 数据库
+    '.db': '[数据库] DB',
+    '.sqlite': '[数据库] SQLite',
+    '.mdb': '[数据库] MDB',
+    
+    # 配置文件
+    '.ini': '[配置] INI',
+    '.conf': '[配置] CONF',
+    '.cfg': '[配置] CFG',
+    '.yaml': '[配置] YAML',
+    '.yml': '[配置] YML',
+    '.toml': '[配置] TOML',
+    
+    # 字体
+    '.ttf': '[字体] TTF',
+    '.otf': '[字体] OTF',
+    '.woff': '[字体] WOFF',
+    '.woff2': '[字体] WOFF2',
+    
+    # 其他
+    '.iso': '[镜像] ISO',
+    '.log': '[日志] LOG',
+    '.md': '[文档] Markdown',
+    '.csv': '[数据] CSV',
+}
+
+# 各视图模式下文件夹使用的图标
+FOLDER_ICON_KEYS = {
+    "列表视图": 'folder_closed_list',
+    "平铺视图": 'folder_closed_tile',
+    "小图标": 'folder_closed_small',
+    "中图标": 'folder_closed_medium',
+    "大图标": 'folder_closed_large',
+}
+
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp', '.ico', '.tiff', '.tif'})
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.rmvb', '.mpg', '.mpeg'})
 
 
 class ImagePreviewWindow:
@@ -272,6 +457,1745 @@ class VideoPreviewWindow:
             print(f"⚠ 视频播放失败: {str(e)}")
 
 
+class StreamingZipExtractor:
+    """流式ZIP解压器 - 边接收数据边解压，不缓存整个压缩包"""
+    LOCAL_HEADER_SIG = b'PK\x03\x04'
+    DATA_DESCRIPTOR_SIG = b'PK\x07\x08'
+    END_SIGS = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06', b'PK\x06\x07')
+
+    def __init__(self, target_dir):
+        self.target_dir = os.path.abspath(target_dir)
+        self.buffer = bytearray()
+        self.state = 'header'
+        self.finished = False
+        self.files_extracted = 0
+        self.bytes_extracted = 0
+        self._entry = None
+        self._out = None
+        self._out_path = None
+
+    def feed(self, data):
+        """送入一段压缩包数据"""
+        if self.finished:
+            return
+        self.buffer += data
+        while not self.finished:
+            if self.state == 'header':
+                if not self._parse_local_header():
+                    break
+            elif self.state == 'data':
+                if not self._consume_data():
+                    break
+            elif self.state == 'descriptor':
+                if not self._parse_descriptor():
+                    break
+
+    def close(self):
+        """结束解压，检查压缩包是否完整"""
+        if not self.finished and (self.state != 'header' or self.buffer):
+            self.abort()
+            raise Exception("压缩包数据不完整")
+
+    def abort(self):
+        """中途出错或取消时关闭正在写入的文件，并删除这个只写了一部分的文件"""
+        if self._out:
+            self._out.close()
+            self._out = None
+            try:
+                os.remove(self._out_path)
+            except OSError:
+                pass
+
+    def _parse_local_header(self):
+        """解析本地文件头"""
+        if len(self.buffer) < 4:
+            return False
+        signature = bytes(self.buffer[:4])
+        if signature in self.END_SIGS:
+            # 到达中央目录，所有文件数据已经处理完毕
+            self.finished = True
+            self.buffer.clear()
+            return False
+        if signature != self.LOCAL_HEADER_SIG:
+            raise Exception("无法识别的压缩包格式")
+        if len(self.buffer) < 30:
+            return False
+
+        (_, _, flags, method, _, _, crc, comp_size, size,
+         name_len, extra_len) = struct.unpack('<4sHHHHHIIIHH', self.buffer[:30])
+        header_len = 30 + name_len + extra_len
+        if len(self.buffer) < header_len:
+            return False
+
+        raw_name = bytes(self.buffer[30:30 + name_len])
+        extra = bytes(self.buffer[30 + name_len:header_len])
+        del self.buffer[:header_len]
+
+        # ZIP64扩展字段
+        zip64 = False
+        pos = 0
+        while pos + 4 <= len(extra):
+            tag, length = struct.unpack('<HH', extra[pos:pos + 4])
+            if tag == 0x0001:
+                zip64 = True
+                values = extra[pos + 4:pos + 4 + length]
+                offset = 0
+                if size == 0xFFFFFFFF and offset + 8 <= len(values):
+                    size = struct.unpack('<Q', values[offset:offset + 8])[0]
+                    offset += 8
+                if comp_size == 0xFFFFFFFF and offset + 8 <= len(values):
+                    comp_size = struct.unpack('<Q', values[offset:offset + 8])[0]
+            pos += 4 + length
+
+        if flags & 0x800:
+            name = raw_name.decode('utf-8')
+        else:
+            try:
+                name = raw_name.decode('utf-8')
+            except UnicodeDecodeError:
+                name = raw_name.decode('cp437')
+
+        if method not in (0, 8):
+            raise Exception(f"不支持的压缩方式: {method} ({name})")
+
+        target_path = self._safe_target_path(name)
+        self._entry = {
+            'name': name,
+            'method': method,
+            'has_descriptor': bool(flags & 0x08),
+            'zip64': zip64,
+            'crc': crc,
+            'comp_size': comp_size,
+            'consumed': 0,
+            'written': 0,
+            'running_crc': 0,
+            'decompressor': zlib.decompressobj(-15) if method == 8 else None,
+        }
+
+        if name.endswith('/'):
+            os.makedirs(target_path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            self._out = open(target_path, 'wb')
+            self._out_path = target_path
+        self.state = 'data'
+        return True
+
+    def _consume_data(self):
+        """处理当前文件的数据部分"""
+        entry = self._entry
+        if not entry['has_descriptor']:
+            # 头部已给出压缩后大小
+            remaining = entry['comp_size'] - entry['consumed']
+            chunk = bytes(self.buffer[:remaining])
+            del self.buffer[:len(chunk)]
+            entry['consumed'] += len(chunk)
+            self._write(self._decompress(chunk))
+            if entry['consumed'] < entry['comp_size']:
+                return False
+            if entry['decompressor']:
+                self._write(entry['decompressor'].flush())
+            self._finish_entry(entry['crc'])
+            return True
+
+        if entry['method'] == 8:
+            # deflate流自带结束标记，读到结尾后剩余数据就是数据描述符
+            decompressor = entry['decompressor']
+            chunk = bytes(self.buffer)
+            self.buffer.clear()
+            entry['consumed'] += len(chunk)
+            self._write(decompressor.decompress(chunk))
+            if not decompressor.eof:
+                return False
+            unused = decompressor.unused_data
+            entry['consumed'] -= len(unused)
+            self.buffer[:0] = unused
+            self.state = 'descriptor'
+            return True
+
+        # 未压缩且大小未知：查找与已写入数据相符的数据描述符
+        descriptor_len = 24 if entry['zip64'] else 16
+        search_from = 0
+        while True:
+            pos = self.buffer.find(self.DATA_DESCRIPTOR_SIG, search_from)
+            if pos < 0 or pos + descriptor_len > len(self.buffer):
+                break
+            crc = zlib.crc32(self.buffer[:pos], entry['running_crc'])
+            if entry['zip64']:
+                _, desc_crc, desc_size, _ = struct.unpack('<4sIQQ', self.buffer[pos:pos + 24])
+            else:
+                _, desc_crc, desc_size, _ = struct.unpack('<4sIII', self.buffer[pos:pos + 16])
+            if desc_crc == crc and desc_size == entry['consumed'] + pos:
+                self._write(bytes(self.buffer[:pos]))
+                del self.buffer[:pos]
+                entry['consumed'] += pos
+                self.state = 'descriptor'
+                return True
+            search_from = pos + 1
+
+        # 保留可能是描述符开头的尾部数据，其余直接写出
+        keep = pos if pos >= 0 else max(len(self.buffer) - 3, 0)
+        if keep > 0:
+            self._write(bytes(self.buffer[:keep]))
+            del self.buffer[:keep]
+            entry['consumed'] += keep
+        return False
+
+    def _parse_descriptor(self):
+        """解析数据描述符"""
+        entry = self._entry
+        if len(self.buffer) < 4:
+            return False
+        has_sig = bytes(self.buffer[:4]) == self.DATA_DESCRIPTOR_SIG
+        start = 4 if has_sig else 0
+        body_len = 20 if entry['zip64'] else 12
+        if len(self.buffer) < start + body_len:
+            return False
+        crc = struct.unpack('<I', self.buffer[start:start + 4])[0]
+        del self.buffer[:start + body_len]
+        self._finish_entry(crc)
+        return True
+
+    def _decompress(self, chunk):
+        decompressor = self._entry['decompressor']
+        return decompressor.decompress(chunk) if decompressor else chunk
+
+    def _write(self, data):
+        if not data:
+            return
+        entry = self._entry
+        entry['running_crc'] = zlib.crc32(data, entry['running_crc'])
+        entry['written'] += len(data)
+        if self._out:
+            self._out.write(data)
+
+    def _finish_entry(self, expected_crc):
+        """完成当前文件并校验CRC"""
+        entry = self._entry
+        if (entry['running_crc'] & 0xFFFFFFFF) != expected_crc:
+            self.abort()
+            raise Exception(f"文件校验失败: {entry['name']}")
+        if self._out:
+            self._out.close()
+            self._out = None
+            self.files_extracted += 1
+            self.bytes_extracted += entry['written']
+        self._entry = None
+        self.state = 'header'
+
+    def _safe_target_path(self, name):
+        """计算解压目标路径，防止路径穿越"""
+        parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+        if not parts or '..' in parts or ':' in parts[0]:
+            raise Exception(f"压缩包中包含非法路径: {name}")
+        target_path = os.path.abspath(os.path.join(self.target_dir, *parts))
+        if os.path.commonpath([target_path, self.target_dir]) != self.target_dir:
+            raise Exception(f"压缩包中包含非法路径: {name}")
+        if name.endswith('/'):
+            target_path += os.sep
+        return target_path
+
+
+class TokenBucket:
+    """令牌桶限速器 - rate为每秒字节数，0表示不限速，可在传输过程中调整"""
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.capacity = 0
+        self.tokens = 0.0
+        self.timestamp = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """调整限速值"""
+        with self.lock:
+            self._refill()
+            self.rate = max(0, int(rate))
+            # 桶容量约为0.25秒的流量，限制突发
+            self.capacity = max(self.rate / 4, 16384)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def consume(self, amount):
+        """取走amount字节的令牌，不足时阻塞到补足为止"""
+        with self.lock:
+            if self.rate <= 0:
+                return
+            self._refill()
+            self.tokens -= amount
+
+        # 分段等待，限速值被调整时能及时生效
+        while True:
+            with self.lock:
+                if self.rate <= 0:
+                    self.tokens = 0.0
+                    return
+                self._refill()
+                if self.tokens >= 0:
+                    return
+                wait = -self.tokens / self.rate
+            time.sleep(min(wait, 0.25))
+
+
+class AdaptiveTimeouts:
+    """自适应超时 - 连接超时跟随实测往返时间(RTT)，读取超时按数据停滞时间计算而非总时长"""
+    MIN_RTO = 0.5               # 最小重传超时（秒）
+    DEFAULT_RTO = 1.0           # 尚无RTT样本时使用
+    PER_ENTRY_SECONDS = 0.0002  # 列表每个项目额外给NAS的处理时间
+    COMMIT_RATE = 100 * 1024 ** 2  # 上传完成后NAS写入落盘的估计速度（字节/秒）
+    MAX_COMMIT_SECONDS = 120.0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.srtt = None
+        self.rttvar = None
+
+    def record(self, rtt):
+        """记录一次小请求的往返时间，按RFC 6298平滑"""
+        with self.lock:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def rto(self):
+        with self.lock:
+            if self.srtt is None:
+                return self.DEFAULT_RTO
+            return max(self.MIN_RTO, self.srtt + 4 * self.rttvar)
+
+    def connect(self):
+        """连接超时 - NAS离线时数秒内即可发现"""
+        return min(max(self.rto() * 3, 3.0), 15.0)
+
+    def stall(self):
+        """停滞超时 - 连续这么久收不到（发不出）数据才判定失败，需容忍硬盘休眠唤醒"""
+        return min(max(self.rto() * 10, 20.0), 120.0)
+
+    def for_api(self, entries=0):
+        """普通API请求的(连接, 读取)超时，按预计返回的项目数放宽"""
+        read = min(max(self.rto() * 4, 5.0), 30.0) + entries * self.PER_ENTRY_SECONDS
+        return (self.connect(), read)
+
+    def for_download(self):
+        """下载的(连接, 读取)超时，读取超时即数据停滞时间，与文件大小无关"""
+        return (self.connect(), self.stall())
+
+    def for_upload(self, payload_size=0):
+        """上传的(连接, 读取)超时，额外留出NAS写入payload_size字节的时间"""
+        commit = min(payload_size / self.COMMIT_RATE, self.MAX_COMMIT_SECONDS)
+        return (self.connect(), self.stall() + commit)
+
+
+class TransferStats:
+    """单个传输任务的统计 - 实时速度（滑动平均）、剩余时间、重试次数以及网络/磁盘耗时"""
+    SAMPLE_INTERVAL = 0.5  # 速度采样间隔（秒）
+    SMOOTHING = 0.3        # 速度滑动平均系数
+    REPORT_INTERVAL = 0.2  # 界面刷新间隔（秒）
+
+    def __init__(self, direction, remote_path, total_size=0):
+        self.direction = direction
+        self.remote_path = remote_path
+        self.total_size = total_size
+        self.transferred = 0
+        self.retries = 0
+        self.speed = 0.0
+        self.network_time = 0.0
+        self.disk_time = 0.0
+        self.throttle_time = 0.0
+        self.started_at = time.time()
+        self.start_time = time.monotonic()
+        self._sample_time = self.start_time
+        self._sample_bytes = 0
+        self._report_time = 0.0
+
+    def add(self, nbytes):
+        """记录新传输的字节数并更新滑动平均速度"""
+        self.transferred += nbytes
+        now = time.monotonic()
+        elapsed = now - self._sample_time
+        if elapsed >= self.SAMPLE_INTERVAL:
+            current = (self.transferred - self._sample_bytes) / elapsed
+            if self.speed:
+                self.speed = self.SMOOTHING * current + (1 - self.SMOOTHING) * self.speed
+            else:
+                self.speed = current
+            self._sample_time = now
+            self._sample_bytes = self.transferred
+
+    def rollback(self, nbytes):
+        """撤销已计入的字节（例如批次中某个文件要重新上传），速度采样基准随之下调"""
+        self.transferred -= nbytes
+        self._sample_bytes = min(self._sample_bytes, self.transferred)
+
+    def resume_from(self, offset):
+        """断点续传：已有的字节计入进度，但不计入速度"""
+        self.transferred = self._sample_bytes = offset
+
+    def retry(self):
+        """开始一次重试，已传输字节重新计数"""
+        self.retries += 1
+        self.transferred = 0
+        self._sample_bytes = 0
+        self._sample_time = time.monotonic()
+
+    def eta(self):
+        """预计剩余秒数，无法估计时返回None"""
+        if self.speed <= 0 or self.total_size <= 0:
+            return None
+        return max(self.total_size - self.transferred, 0) / self.speed
+
+    def should_report(self):
+        """限制界面刷新频率"""
+        now = time.monotonic()
+        if now - self._report_time >= self.REPORT_INTERVAL:
+            self._report_time = now
+            return True
+        return False
+
+    def timed_iter(self, iterable):
+        """迭代网络数据块，并把等待数据的时间计入网络耗时"""
+        iterator = iter(iterable)
+        while True:
+            wait_start = time.monotonic()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                self.network_time += time.monotonic() - wait_start
+                return
+            self.network_time += time.monotonic() - wait_start
+            yield chunk
+
+    def throttle(self, buckets, nbytes):
+        """从令牌桶取令牌，并计入限速等待时间"""
+        wait_start = time.monotonic()
+        for bucket in buckets:
+            bucket.consume(nbytes)
+        self.throttle_time += time.monotonic() - wait_start
+
+    def to_record(self, nas, result, error=''):
+        """生成一条传输历史记录"""
+        duration = time.monotonic() - self.start_time
+        size = self.transferred or self.total_size
+        network_time = self.network_time
+        if self.direction == 'upload':
+            # 上传时数据由requests发送，网络耗时为总耗时扣除读盘和限速等待
+            network_time = max(duration - self.disk_time - self.throttle_time, 0.0)
+        return {
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'direction': self.direction,
+            'nas': nas,
+            'remote_path': self.remote_path,
+            'size': size,
+            'duration': round(duration, 3),
+            'avg_speed': int(size / duration) if duration > 0 else 0,
+            'retries': self.retries,
+            'network_time': round(network_time, 3),
+            'disk_time': round(self.disk_time, 3),
+            'throttle_time': round(self.throttle_time, 3),
+            'result': result,
+            'error': error.replace('\n', ' '),
+        }
+
+
+class TransferHistory:
+    """传输历史 - 每个传输结束后向CSV文件追加一行，便于长期对比各NAS和卷的速度"""
+    FIELDS = ['finished_at', 'direction', 'nas', 'remote_path', 'size', 'duration', 'avg_speed',
+              'retries', 'network_time', 'disk_time', 'throttle_time', 'result', 'error']
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def append(self, record):
+        """追加一条记录，写入失败只打印警告"""
+        with self.lock:
+            try:
+                write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+                    if write_header:
+                        writer.writeheader()
+                    writer.writerow(record)
+            except Exception as e:
+                print(f"⚠ 写入传输历史失败: {e}")
+
+
+class TransferReader:
+    """文件读取包装器 - 上传时边读取边计算哈希、限速并统计进度，无需再次读取文件"""
+    def __init__(self, fileobj, hasher=None, buckets=(), stats=None, on_progress=None):
+        self.fileobj = fileobj
+        self.hasher = hasher
+        self.buckets = buckets
+        self.stats = stats
+        self.on_progress = on_progress
+
+    def read(self, size=-1):
+        disk_start = time.monotonic()
+        data = self.fileobj.read(size)
+        if self.stats:
+            self.stats.disk_time += time.monotonic() - disk_start
+        if data:
+            if self.hasher:
+                self.hasher.update(data)
+            if self.stats:
+                self.stats.throttle(self.buckets, len(data))
+                self.stats.add(len(data))
+            else:
+                for bucket in self.buckets:
+                    bucket.consume(len(data))
+            if self.on_progress:
+                self.on_progress(len(data))
+        return data
+
+
+class TransferCancelled(Exception):
+    """用户取消了传输"""
+
+
+class TransferVerifyError(Exception):
+    """传输后MD5校验失败（校验重试已用尽），或无法取得NAS端MD5。
+    文件本身已传输完成，外层不应再按网络错误重新传输"""
+
+
+class NASAPIError(Exception):
+    """NAS返回的API错误，code为FileStation错误码"""
+    # 重试也不会成功的错误：权限不足、文件已存在、文件名缺失、文件过大
+    # 会话失效（105/106/119）时NASSession已重新登录，可以重试
+    NON_RETRIABLE = {407, 414, 1802, 1804, 1805}
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+    @property
+    def retriable(self):
+        return self.code not in self.NON_RETRIABLE
+
+
+class UploadBatch:
+    """一批上传任务的汇总 - 总进度、速度、已完成数量和每个文件的结果"""
+    def __init__(self, jobs, dest_path):
+        file_paths = [file_path for file_path, _ in jobs]
+        self.file_paths = file_paths
+        self.dest_path = dest_path
+        self.total_files = len(file_paths)
+        total_size = 0
+        for path in file_paths:
+            try:
+                total_size += os.path.getsize(path)
+            except OSError:
+                pass
+        self.stats = TransferStats('upload_batch', dest_path, total_size)
+        self.results = {'ok': [], 'failed': [], 'cancelled': []}
+        self.journal_ids = {}
+        self.lock = threading.Lock()
+        self._file_bytes = {}
+
+    def add(self, file_path, nbytes):
+        """记录某个文件新上传的字节数，返回是否需要刷新界面"""
+        with self.lock:
+            self._file_bytes[file_path] = self._file_bytes.get(file_path, 0) + nbytes
+            self.stats.add(nbytes)
+            return self.stats.should_report()
+
+    def rewind(self, file_path):
+        """文件重新上传时，从总进度中扣除其已计入的字节"""
+        with self.lock:
+            self.stats.rollback(self._file_bytes.pop(file_path, 0))
+
+    def finish_file(self, file_path, result, error=''):
+        """记录单个文件的最终结果"""
+        with self.lock:
+            if result == 'failed':
+                self.results['failed'].append((file_path, error))
+            else:
+                self.results[result].append(file_path)
+
+    def finished_count(self):
+        with self.lock:
+            return sum(len(items) for items in self.results.values())
+
+
+class MultipartUploadStream:
+    """流式multipart请求体 - 从磁盘分块读取文件边读边发送，内存占用与文件大小无关"""
+    def __init__(self, fields, file_field, filename, fileobj, file_size,
+                 content_type='application/octet-stream', cancel_event=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.fileobj = fileobj
+        self.file_size = file_size
+        self.cancel_event = cancel_event
+
+        # 普通字段在前，文件在最后（FileStation要求文件部分放在最后）
+        preamble = bytearray()
+        for name, value in fields.items():
+            preamble += (f'--{self.boundary}\r\n'
+                         f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                         f'{value}\r\n').encode('utf-8')
+        quoted_name = filename.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+        preamble += (f'--{self.boundary}\r\n'
+                     f'Content-Disposition: form-data; name="{file_field}"; filename="{quoted_name}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n').encode('utf-8')
+        self.parts = [bytes(preamble), None, f'\r\n--{self.boundary}--\r\n'.encode('utf-8')]
+        self.length = len(self.parts[0]) + file_size + len(self.parts[2])
+
+        self._part = 0
+        self._offset = 0
+        self._file_read = 0
+
+    def __len__(self):
+        # requests据此设置Content-Length，避免使用分块传输编码
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(65536)
+            if not chunk:
+                return
+            yield chunk
+
+    def read(self, size=-1):
+        """读取下一段请求体，size<0时按64KB分块"""
+        if self.cancel_event and self.cancel_event.is_set():
+            raise TransferCancelled("上传已取消")
+        if size is None or size < 0:
+            size = 65536
+
+        while self._part < len(self.parts):
+            if self._part == 1:
+                data = self.fileobj.read(min(size, self.file_size - self._file_read))
+                if data:
+                    self._file_read += len(data)
+                    return data
+                if self._file_read < self.file_size:
+                    raise Exception("文件在上传过程中被修改，请重新上传")
+            else:
+                part = self.parts[self._part]
+                if self._offset < len(part):
+                    data = part[self._offset:self._offset + size]
+                    self._offset += len(data)
+                    return data
+            self._part += 1
+            self._offset = 0
+        return b''
+
+
+class SyncPlan:
+    """单向同步计划 - 比较本地目录与NAS上的文件（大小+修改时间），只上传新增或修改过的文件"""
+    MTIME_TOLERANCE = 2  # 修改时间允许的误差（秒），兼容只保存到偶数秒的文件系统
+
+    def __init__(self, local_dir, remote_root):
+        self.local_dir = local_dir
+        self.remote_root = remote_root
+        self.folders = []   # 需要创建的远程文件夹
+        self.uploads = []   # (本地文件, 远程目录, 原因)
+        self.skipped = 0
+        self.bytes_to_send = 0
+        self.bytes_skipped = 0
+
+    def compare(self, folders, jobs, remote_files, remote_dirs):
+        """根据远程文件表{路径: (大小, 修改时间)}生成上传列表"""
+        self.folders = [folder for folder in folders if folder not in remote_dirs]
+        for file_path, remote_dir in jobs:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            remote = remote_files.get(f"{remote_dir}/{os.path.basename(file_path)}")
+            if remote is None:
+                reason = '新增'
+            elif remote[0] != st.st_size or abs(remote[1] - st.st_mtime) > self.MTIME_TOLERANCE:
+                reason = '修改'
+            else:
+                self.skipped += 1
+                self.bytes_skipped += st.st_size
+                continue
+            self.uploads.append((file_path, remote_dir, reason))
+            self.bytes_to_send += st.st_size
+
+    @property
+    def jobs(self):
+        return [(file_path, remote_dir) for file_path, remote_dir, _ in self.uploads]
+
+
+class SyncPlanDialog:
+    """同步计划窗口 - 预览（dry-run）将要上传和跳过的文件，确认后才开始同步"""
+    def __init__(self, parent, plan, format_size, on_confirm):
+        self.plan = plan
+        self.on_confirm = on_confirm
+        self.window = tk.Toplevel(parent)
+        self.window.title(f"同步计划 - {plan.local_dir}")
+        self.window.geometry("760x480")
+        self.window.transient(parent)
+        
+        summary = (f"目标: {plan.remote_root}\n"
+                   f"需要上传 {len(plan.uploads)} 个文件 ({format_size(plan.bytes_to_send)})，"
+                   f"跳过未修改的 {plan.skipped} 个文件 ({format_size(plan.bytes_skipped)})，"
+                   f"新建 {len(plan.folders)} 个文件夹")
+        ttk.Label(self.window, text=summary, justify=tk.LEFT).pack(fill=tk.X, padx=10, pady=(10, 5))
+        
+        list_frame = ttk.Frame(self.window)
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        tree = ttk.Treeview(list_frame, columns=('reason', 'size', 'remote'), show='tree headings')
+        tree.heading('#0', text='本地文件')
+        tree.heading('reason', text='原因')
+        tree.heading('size', text='大小')
+        tree.heading('remote', text='远程目录')
+        tree.column('#0', width=300)
+        tree.column('reason', width=60)
+        tree.column('size', width=90)
+        tree.column('remote', width=250)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        for file_path, remote_dir, reason in plan.uploads:
+            try:
+                size = format_size(os.path.getsize(file_path))
+            except OSError:
+                size = ""
+            tree.insert('', 'end', text=os.path.relpath(file_path, plan.local_dir),
+                        values=(reason, size, remote_dir))
+        
+        button_frame = ttk.Frame(self.window)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(button_frame, text="关闭", command=self.window.destroy).pack(side=tk.RIGHT)
+        start_btn = ttk.Button(button_frame, text="开始同步", command=self.confirm)
+        start_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        if not plan.uploads and not plan.folders:
+            start_btn.configure(state='disabled')
+        
+    def confirm(self):
+        """确认同步"""
+        self.window.destroy()
+        self.on_confirm(self.plan)
+
+
+class InotifyBackend:
+    """Linux inotify监视后端 - 通过ctypes调用libc，每个目录一个watch，事件直接给出变化的文件"""
+    exact = True  # 事件精确到文件，上传前无需再与NAS比较
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, root):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches = {}  # wd -> 目录路径
+        try:
+            self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, root, files=None):
+        """为目录树中的每个目录添加watch，files不为None时收集其中已有的文件"""
+        for dirpath, dirnames, filenames in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"无法监视目录 {dirpath}（可能超过max_user_watches限制）")
+            self.watches[wd] = dirpath
+            if files is not None:
+                files.extend(os.path.join(dirpath, name) for name in filenames)
+
+    def poll(self, timeout):
+        """等待事件，返回(变化的文件列表, 是否发生事件队列溢出)"""
+        changed = []
+        overflow = False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed, overflow
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + name_len].rstrip(b'\0'))
+                offset += name_len
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & self.IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & self.IN_ISDIR:
+                    # 新目录：添加监视，并把监视建立前已写入的文件加入队列
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        try:
+                            self._add_tree(path, changed)
+                        except OSError as e:
+                            print(f"⚠ {e}")
+                            overflow = True
+                else:
+                    changed.append(path)
+        return changed, overflow
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class DirectorySnapshot:
+    """目录树快照 - 只为每个目录保存一个指纹（条目名、大小、修改时间的摘要），内存占用与文件数量无关"""
+    def __init__(self, root):
+        self.root = root
+        self.fingerprints = {}
+
+    def scan(self, initial=False):
+        """遍历目录树，返回指纹发生变化的目录中的文件；initial为True时只建立快照"""
+        changed = []
+        seen = set()
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            digest = hashlib.md5()
+            files = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file():
+                                st = entry.stat()
+                                digest.update(f"{entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+                                files.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            seen.add(directory)
+            fingerprint = digest.digest()
+            if self.fingerprints.get(directory) != fingerprint:
+                self.fingerprints[directory] = fingerprint
+                if not initial:
+                    changed.extend(files)
+        # 清理已删除目录的指纹
+        for directory in set(self.fingerprints) - seen:
+            del self.fingerprints[directory]
+        return changed
+
+
+class PollingBackend:
+    """轮询监视后端 - 定期与目录树快照比较，内存占用与文件数量无关"""
+    exact = False  # 只知道哪个目录变了，上传前需与NAS比较
+    INTERVAL = 5.0
+
+    def __init__(self, root):
+        self.snapshot = DirectorySnapshot(root)
+        self.last_scan = time.monotonic()
+        self.snapshot.scan(initial=True)
+
+    def poll(self, timeout):
+        if time.monotonic() - self.last_scan < self.INTERVAL:
+            time.sleep(timeout)
+            return [], False
+        changed = self.snapshot.scan()
+        self.last_scan = time.monotonic()
+        return changed, False
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """文件夹监视器 - 合并突发的文件事件，文件在稳定期内不再变化后才成批交给上传回调"""
+    SETTLE_SECONDS = 3.0    # 文件大小和修改时间保持不变多久后才上传
+    DEBOUNCE_SECONDS = 1.0  # 最后一个事件之后再等多久才提交一批
+    MAX_BATCH = 500         # 单批最多文件数
+    RETRY_BASE = 10.0       # 上传失败或未登录时重新排队的退避基数（秒）
+    RETRY_MAX = 300.0       # 退避上限（秒）
+    RESCAN_INTERVAL = 30.0  # 事件队列溢出后两次重新扫描的最短间隔（秒）
+
+    def __init__(self, local_dir, on_batch):
+        self.local_dir = local_dir
+        self.on_batch = on_batch      # on_batch(文件列表, 是否精确)，返回需要重试的文件
+        self.pending = {}             # 路径 -> (上次看到的(大小, 修改时间), 最后变化时间)
+        self.failures = {}            # 路径 -> 连续失败次数
+        self.inexact = set()          # 由重新扫描发现的文件，上传前需与NAS比较
+        self.snapshot = None          # 精确后端的目录树快照，事件丢失时只扫描变化过的目录
+        self.rescan_due = False
+        self.last_rescan = None
+        self.stop_event = threading.Event()
+        self.backend = None
+        self.thread = None
+
+    def start(self):
+        """创建监视后端并启动监视线程，Linux优先使用inotify"""
+        if sys.platform.startswith('linux'):
+            try:
+                self.backend = InotifyBackend(self.local_dir)
+                print(f"✓ 使用inotify监视 {self.local_dir}")
+            except (OSError, AttributeError) as e:
+                print(f"⚠ inotify不可用，改用轮询: {e}")
+        if self.backend is None:
+            self.backend = PollingBackend(self.local_dir)
+            print(f"✓ 使用轮询监视 {self.local_dir}")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def backoff(self, failures):
+        return min(self.RETRY_MAX, self.RETRY_BASE * (2 ** (failures - 1)))
+
+    def requeue(self, paths, now):
+        """把上传失败或被跳过的文件重新放回待上传队列，按失败次数推迟"""
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.failures.pop(path, None)
+                continue  # 文件已被删除
+            failures = self.failures.get(path, 0) + 1
+            self.failures[path] = failures
+            # 稳定期从退避结束后才开始计算
+            self.pending[path] = ((st.st_size, st.st_mtime_ns), now + self.backoff(failures))
+        if paths:
+            print(f"⚠ {len(paths)} 个监视文件将稍后重试")
+
+    def rescan(self, now):
+        """事件队列溢出后与上次的目录快照比较，只把指纹变化过的目录中的文件加入队列，
+        这些文件上传前再与NAS比较"""
+        self.rescan_due = False
+        self.last_rescan = now
+        changed = self.snapshot.scan()
+        print(f"⚠ 监视事件丢失，重新扫描发现 {len(changed)} 个可能变化的文件")
+        for path in changed:
+            if path not in self.pending:
+                self.pending[path] = (None, now)
+            self.inexact.add(path)
+
+    def _run(self):
+        ready = []
+        last_event = 0.0
+        try:
+            if self.backend.exact:
+                # 在监视线程中建立快照，内存占用只与目录数量有关
+                self.snapshot = DirectorySnapshot(self.local_dir)
+                self.snapshot.scan(initial=True)
+            while not self.stop_event.is_set():
+                changed, overflow = self.backend.poll(0.5)
+                now = time.monotonic()
+                if overflow and self.snapshot:
+                    self.rescan_due = True
+                # 连续溢出时合并成一次，两次扫描之间至少间隔RESCAN_INTERVAL
+                if self.rescan_due and (self.last_rescan is None or now - self.last_rescan >= self.RESCAN_INTERVAL):
+                    self.rescan(now)
+                    last_event = now
+                for path in changed:
+                    self.pending[path] = (None, now)
+                    last_event = now
+                
+                # 检查待上传文件是否已稳定
+                for path, (signature, since) in list(self.pending.items()):
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        del self.pending[path]
+                        continue
+                    if not stat.S_ISREG(st.st_mode):
+                        del self.pending[path]
+                        continue
+                    current = (st.st_size, st.st_mtime_ns)
+                    if current != signature:
+                        self.pending[path] = (current, now)
+                    elif now - since >= self.SETTLE_SECONDS:
+                        del self.pending[path]
+                        ready.append(path)
+                
+                if ready and (now - last_event >= self.DEBOUNCE_SECONDS or len(ready) >= self.MAX_BATCH):
+                    batch, ready = ready[:self.MAX_BATCH], ready[self.MAX_BATCH:]
+                    unverified = self.inexact.intersection(batch)
+                    self.inexact.difference_update(unverified)
+                    exact = self.backend.exact and not unverified
+                    try:
+                        retry = self.on_batch(batch, exact) or []
+                    except Exception as e:
+                        print(f"⚠ 上传监视文件失败: {e}")
+                        retry = batch
+                    retry_set = set(retry)
+                    for path in batch:
+                        if path not in retry_set:
+                            self.failures.pop(path, None)
+                    self.inexact.update(unverified & retry_set)
+                    self.requeue(retry, time.monotonic())
+        finally:
+            self.backend.close()
+
+
+class TransferJournal:
+    """传输队列日志（SQLite） - 记录未完成的上传和下载，程序重启并登录后自动续传
+    
+    使用WAL模式和synchronous=NORMAL；新任务整批一次提交，完成/进度等更新合并后定期提交，避免每个文件一次fsync。
+    """
+    FLUSH_INTERVAL = 2.0  # 合并提交的最长间隔（秒）
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.dirty = False
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS transfers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nas TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                remote_path TEXT NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL)""")
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠ 无法打开传输日志 {path}: {e}")
+            self.conn = None
+
+    def add_many(self, nas, direction, items):
+        """登记一批任务[(本地路径, 远程路径)]，立即提交，返回各任务的id"""
+        if not self.conn:
+            return [None] * len(items)
+        with self.lock:
+            try:
+                now = time.time()
+                ids = []
+                for local_path, remote_path in items:
+                    cursor = self.conn.execute(
+                        "INSERT INTO transfers (nas, direction, local_path, remote_path, created) VALUES (?, ?, ?, ?, ?)",
+                        (nas, direction, local_path, remote_path, now))
+                    ids.append(cursor.lastrowid)
+                self.conn.commit()
+                self.dirty = False
+                self.last_flush = time.monotonic()
+                return ids
+            except sqlite3.Error as e:
+                print(f"⚠ 写入传输日志失败: {e}")
+                return [None] * len(items)
+
+    def set_size(self, entry_id, size):
+        """记录远程文件大小，续传时用于判断文件是否已改变"""
+        self._update("UPDATE transfers SET size = ? WHERE id = ?", (size, entry_id))
+
+    def remove(self, entry_id):
+        """任务结束（成功、失败或用户取消）后移除"""
+        self._update("DELETE FROM transfers WHERE id = ?", (entry_id,))
+
+    def _update(self, sql, args):
+        if not self.conn or args[-1] is None:
+            return
+        with self.lock:
+            try:
+                self.conn.execute(sql, args)
+                self.dirty = True
+                if time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL:
+                    self._commit()
+            except sqlite3.Error as e:
+                print(f"⚠ 写入传输日志失败: {e}")
+
+    def _commit(self):
+        self.conn.commit()
+        self.dirty = False
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        """提交所有未提交的更新"""
+        if not self.conn:
+            return
+        with self.lock:
+            try:
+                if self.dirty:
+                    self._commit()
+            except sqlite3.Error as e:
+                print(f"⚠ 写入传输日志失败: {e}")
+
+    def pending(self, nas):
+        """返回该NAS上未完成的任务[(id, 方向, 本地路径, 远程路径, 大小)]"""
+        if not self.conn:
+            return []
+        with self.lock:
+            try:
+                return self.conn.execute(
+                    "SELECT id, direction, local_path, remote_path, size FROM transfers WHERE nas = ? ORDER BY id",
+                    (nas,)).fetchall()
+            except sqlite3.Error as e:
+                print(f"⚠ 读取传输日志失败: {e}")
+                return []
+
+
+class NASUnavailableError(requests.ConnectionError):
+    """断路器打开期间直接失败，不再等待超时"""
+
+
+class CircuitBreaker:
+    """单个NAS的断路器 - 连续多次连接失败（无法建立连接）后在一段时间内直接失败，之后只放行一个探测请求。
+    读超时和5xx响应说明NAS可达，不计入失败"""
+    FAILURE_THRESHOLD = 5   # 连续失败多少次后打开
+    RESET_TIMEOUT = 30.0    # 打开后多久允许探测（秒）
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self):
+        """是否允许发出请求"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.RESET_TIMEOUT:
+                return False
+            # 半开状态：只放行一个探测请求
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                print("✓ NAS已恢复连接，断路器关闭")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.opened_at is not None or self.failures >= self.FAILURE_THRESHOLD:
+                if self.opened_at is None:
+                    print(f"⚠ NAS连续 {self.failures} 次连接失败，{self.RESET_TIMEOUT:.0f} 秒内的请求将直接失败")
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """请求以非连接错误结束：不改变计数，只结束探测，让后续请求可以再次探测"""
+        with self.lock:
+            self.probing = False
+
+    def remaining(self):
+        """距离允许探测还剩多少秒"""
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(self.RESET_TIMEOUT - (time.monotonic() - self.opened_at), 0.0)
+
+
+class NASSession(requests.Session):
+    """带重试的HTTP会话
+    
+    - 连接建立失败由urllib3的Retry在连接层重试（请求尚未发出，任何方法都安全）
+    - 幂等请求（GET，或显式传入idempotent=True）遇到超时、连接中断或502/503/504时按带抖动的指数退避重试
+    - 每个NAS一个断路器，连续无法建立连接时后续请求立即失败，而不是每个线程各自等待超时
+    - 有副作用的GET请求（如启动后台任务、登出）需传入idempotent=False
+    - 默认会话有效，不预先探测；API返回会话失效错误时调用reauthenticate重新登录并重放一次请求
+    """
+    RETRY_ATTEMPTS = 3       # 幂等请求的最大重试次数
+    BACKOFF_BASE = 0.5       # 退避基数（秒）
+    BACKOFF_MAX = 8.0        # 单次退避上限（秒）
+    RETRY_STATUS = {502, 503, 504}
+    AUTH_ERROR_CODES = {105, 106, 119}  # 权限不足/会话超时/SID不存在
+    ERROR_BODY_LIMIT = 4096             # 错误响应很小，超过这个大小的响应不是错误
+    FAILURE_MARKER = re.compile(rb'"success"\s*:\s*false')
+
+    def __init__(self):
+        super().__init__()
+        retry = Retry(total=None, connect=2, read=0, status=0, other=0, redirect=5, backoff_factor=0.2)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=MAX_UPLOAD_PARALLELISM + 4)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.breakers = {}
+        self.breakers_lock = threading.Lock()
+        self.reauthenticate = None  # 重新登录回调，返回是否成功
+        self.auth_lock = threading.Lock()
+        self.auth_generation = 0    # 每次重新登录后加一，避免多个线程重复登录
+        self.last_activity = time.monotonic()  # 最近一次收到响应的时间，供心跳判断是否空闲
+
+    def breaker_for(self, url):
+        """按协议+主机+端口区分NAS"""
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}"
+        with self.breakers_lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker()
+            return self.breakers[key]
+
+    @staticmethod
+    def is_connect_error(error):
+        """是否是连接建立阶段的失败"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+    def request(self, method, url, *args, **kwargs):
+        generation = self.auth_generation
+        response = self._request_with_retry(method, url, *args, **kwargs)
+        if self.reauthenticate and self.is_auth_error(response, kwargs):
+            if self.renew_auth(generation):
+                data = kwargs.get('data')
+                if data is None or isinstance(data, (dict, str, bytes)):
+                    response.close()
+                    print("✓ 会话已重新建立，重放请求")
+                    response = self._request_with_retry(method, url, *args, **kwargs)
+        return response
+
+    def is_auth_error(self, response, kwargs):
+        """响应是否是会话失效错误（登录请求本身除外）"""
+        if 'json' not in response.headers.get('content-type', ''):
+            return False
+        for fields in (kwargs.get('params'), kwargs.get('data')):
+            if isinstance(fields, dict) and fields.get('api') == 'SYNO.API.Auth':
+                return False
+        # 错误响应很小，只检查较小的响应；分块传输没有Content-Length时按实际长度判断。
+        # 先在原始字节中查找 "success":false，找到才解析，正常结果不会在这里被多解析一遍
+        length = response.headers.get('content-length')
+        if length and length.isdigit() and int(length) > self.ERROR_BODY_LIMIT:
+            return False
+        body = response.content
+        if len(body) > self.ERROR_BODY_LIMIT or not self.FAILURE_MARKER.search(body):
+            return False
+        try:
+            result = response.json()
+        except ValueError:
+            return False
+        return (isinstance(result, dict) and not result.get('success', True)
+                and result.get('error', {}).get('code') in self.AUTH_ERROR_CODES)
+
+    def renew_auth(self, generation):
+        """重新登录；其它线程已在本请求发出后重新登录过时直接返回成功"""
+        with self.auth_lock:
+            if self.auth_generation != generation:
+                return True
+            print("⚠ 会话已失效，正在重新登录...")
+            if self.reauthenticate():
+                self.auth_generation += 1
+                return True
+            return False
+
+    def _request_with_retry(self, method, url, *args, idempotent=None, **kwargs):
+        if idempotent is None:
+            idempotent = method.upper() in ('GET', 'HEAD')
+        breaker = self.breaker_for(url)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise NASUnavailableError(f"NAS暂时无法连接，请 {breaker.remaining():.0f} 秒后重试")
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # 只有无法建立连接才计入断路器；连接建立失败已由urllib3重试过，这里不再叠加重试
+                if self.is_connect_error(e):
+                    breaker.record_failure()
+                    raise
+                breaker.release()
+                if not idempotent or attempt >= self.RETRY_ATTEMPTS:
+                    raise
+                print(f"⚠ 请求失败，准备重试 ({attempt + 1}/{self.RETRY_ATTEMPTS}): {e}")
+            except BaseException:
+                # 请求体读取失败、传输被取消等：结束探测，避免断路器一直停在半开状态
+                breaker.release()
+                raise
+            else:
+                self.last_activity = time.monotonic()
+                # 收到响应说明NAS可达（包括5xx）
+                breaker.record_success()
+                if response.status_code not in self.RETRY_STATUS:
+                    return response
+                if not idempotent or attempt >= self.RETRY_ATTEMPTS:
+                    return response
+                response.close()
+                print(f"⚠ NAS返回 {response.status_code}，准备重试 ({attempt + 1}/{self.RETRY_ATTEMPTS})")
+            # 带抖动的指数退避，避免多个线程同时重试
+            delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * (2 ** attempt))
+            time.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+
+
+class FileEntry:
+    """文件列表中的一项 - 显示用的字符串在加载线程中预先生成，界面线程只负责绘制"""
+    __slots__ = ('name', 'is_dir', 'size', 'mtime', 'is_image', 'is_video', 'values',
+                 'name_lower', 'sort_name')
+    NUMBER_PATTERN = re.compile(r'(\d+)')
+
+    def __init__(self, name, is_dir, size, mtime, type_label, size_text, mtime_text):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        ext = os.path.splitext(name)[1].lower()
+        self.is_image = not is_dir and ext in IMAGE_EXTENSIONS
+        self.is_video = not is_dir and ext in VIDEO_EXTENSIONS
+        self.values = (name, type_label, size_text, mtime_text)
+        # 排序和筛选用的键：自然排序（file2排在file10前面），不区分大小写
+        self.name_lower = name.casefold()
+        self.sort_name = tuple(int(part) if part.isdecimal() else part
+                               for part in self.NUMBER_PATTERN.split(self.name_lower))
+
+    @staticmethod
+    def type_label(name, is_dir):
+        if is_dir:
+            return "[文件夹]"
+        ext = os.path.splitext(name)[1].lower()
+        return FILE_TYPE_LABELS.get(ext, f'[文件] {ext[1:].upper() if ext else "未知"}')
+
+    @staticmethod
+    def format_times(mtimes):
+        """批量格式化时间戳 - 同一分钟内的时间只调用一次strftime"""
+        minutes = {}
+        texts = []
+        for mtime in mtimes:
+            if mtime is None:
+                texts.append("")
+                continue
+            minute, second = divmod(int(mtime), 60)
+            prefix = minutes.get(minute)
+            if prefix is None:
+                prefix = minutes[minute] = datetime.fromtimestamp(minute * 60).strftime('%Y-%m-%d %H:%M')
+            texts.append(f"{prefix}:{second:02d}")
+        return texts
+
+    @staticmethod
+    def listing_fields(file_info):
+        """从FileStation.List的文件信息中取出 (名称, 是否文件夹, 大小, 修改时间)，没有的附加信息为None"""
+        is_dir = file_info['isdir']
+        additional = file_info.get('additional', {})
+        size = int(additional['size']) if not is_dir and 'size' in additional else None
+        mtime = additional['time']['mtime'] if 'time' in additional else None
+        return file_info['name'], is_dir, size, mtime
+
+    def same_as(self, file_info):
+        """列表中的文件信息与本条目相比是否没有变化（按名称、大小和修改时间比较）"""
+        name, is_dir, size, mtime = self.listing_fields(file_info)
+        return name == self.name and is_dir == self.is_dir and (size or 0) == self.size and (mtime or 0) == self.mtime
+
+    @classmethod
+    def from_listing(cls, files, format_size):
+        """把FileStation.List返回的文件信息转换为FileEntry列表"""
+        fields = [cls.listing_fields(file_info) for file_info in files]
+        mtime_texts = cls.format_times([mtime for name, is_dir, size, mtime in fields])
+        
+        entries = []
+        for (name, is_dir, size, mtime), mtime_text in zip(fields, mtime_texts):
+            size_text = format_size(size) if size is not None else ""
+            entries.append(cls(name, is_dir, size or 0, mtime or 0, cls.type_label(name, is_dir),
+                               size_text, mtime_text))
+        return entries
+
+
+class FileListModel:
+    """文件列表的数据模型 - 保存当前文件夹的全部条目，在内存中排序和筛选。
+    各列的排序结果在加载线程中预先算好，点击列标题只需拼接（或反转）现成的列表。
+    文件夹过大时切换为服务器端模式：排序和筛选交给NAS，条目按页追加"""
+    SERVER_SORT_FIELDS = {'name': 'name', 'type': 'type', 'size': 'size', 'modified': 'mtime'}
+    # 与build_orders中整数键等价的排序键，用于把少量新条目插入已排好的列表
+    SORT_KEYS = {
+        'name': lambda entry: entry.sort_name,
+        'type': lambda entry: (entry.values[1], entry.sort_name),
+        'size': lambda entry: (entry.size, entry.sort_name),
+        'modified': lambda entry: (entry.mtime, entry.sort_name),
+    }
+    FILE_TYPES = {"全部": 'all', "文件夹": 'dir', "文件": 'file'}
+
+    def __init__(self):
+        self.path = None
+        self.entries = []
+        self.sort_column = 'name'
+        self.sort_reverse = False
+        self.filter_text = ""
+        self.filter_type = 'all'
+        self.sorted_cache = {}
+        self.server_side = False
+        self.total = 0
+        self.loading = False      # 服务器端模式下正在加载下一页
+        self.generation = 0       # 每次重新加载时递增，用于丢弃过期的结果
+
+    def set_entries(self, path, entries, orders=None, server_side=False, total=None):
+        self.path = path
+        self.entries = entries
+        self.server_side = server_side
+        self.total = len(entries) if total is None else total
+        self.loading = False
+        if server_side:
+            self.sorted_cache = {}
+        else:
+            self.sorted_cache = orders if orders is not None else self.build_orders(entries)
+
+    @classmethod
+    def merge_listing(cls, old_entries, old_orders, files, format_size):
+        """把新的列表结果与当前条目比较，未变化的条目原样复用，只为新增或修改的文件创建条目，
+        并把它们插入已排好序的列表。没有任何变化时返回None，否则返回 (条目, 排序结果)"""
+        old = {entry.name: entry for entry in old_entries}
+        entries = []
+        changed_files = []
+        for file_info in files:
+            entry = old.get(file_info['name'])
+            if entry is not None and entry.same_as(file_info):
+                entries.append(entry)
+            else:
+                changed_files.append(file_info)
+        
+        added = FileEntry.from_listing(changed_files, format_size)
+        if not added and len(entries) == len(old_entries):
+            return None
+        
+        kept = {id(entry) for entry in entries}
+        orders = {}
+        for column, groups in old_orders.items():
+            key = cls.SORT_KEYS[column]
+            folders, files_sorted = ([entry for entry in group if id(entry) in kept] for group in groups)
+            # bisect的key参数需要Python 3.10，这里维护一份平行的键列表
+            folder_keys = [key(entry) for entry in folders]
+            file_keys = [key(entry) for entry in files_sorted]
+            for entry in added:
+                target, target_keys = (folders, folder_keys) if entry.is_dir else (files_sorted, file_keys)
+                entry_key = key(entry)
+                index = bisect.bisect(target_keys, entry_key)
+                target_keys.insert(index, entry_key)
+                target.insert(index, entry)
+            orders[column] = (folders, files_sorted)
+        return entries + added, orders
+
+    def has_more(self):
+        return self.server_side and len(self.entries) < self.total
+
+    def query(self, path):
+        """列表请求的排序和筛选参数。只有该文件夹已处于服务器端模式时才让NAS筛选，
+        否则需要完整列表以便在本地筛选"""
+        params = {
+            'sort_by': self.SERVER_SORT_FIELDS[self.sort_column],
+            'sort_direction': 'desc' if self.sort_reverse else 'asc',
+        }
+        if self.server_side and path == self.path:
+            text = self.filter_text.strip()
+            if text:
+                # 筛选文本按字面匹配：通配符放进方括号转义；逗号在pattern中用于分隔多个模式，
+                # 无法转义，改用匹配任意单个字符的?
+                text = re.sub(r'([*?\[])', r'[\1]', text).replace(',', '?')
+                params['pattern'] = f"*{text}*"
+            if self.filter_type != 'all':
+                params['filetype'] = self.filter_type
+        return params
+
+    @staticmethod
+    def _sort_group(group):
+        """对一组条目按每一列排序。先按文件名自然排序得到名次，其他列用
+        "列值 * 数量 + 名次" 这样的整数作为键，避免逐个比较元组"""
+        by_name = sorted(group, key=lambda entry: entry.sort_name)
+        count = len(by_name) or 1
+        ranks = {id(entry): rank for rank, entry in enumerate(by_name)}
+        type_ranks = {label: rank for rank, label in enumerate(sorted({entry.values[1] for entry in group}))}
+        return {
+            'name': by_name,
+            'type': sorted(by_name, key=lambda entry: type_ranks[entry.values[1]] * count + ranks[id(entry)]),
+            'size': sorted(by_name, key=lambda entry: entry.size * count + ranks[id(entry)]),
+            'modified': sorted(by_name, key=lambda entry: entry.mtime * count + ranks[id(entry)]),
+        }
+
+    @classmethod
+    def build_orders(cls, entries):
+        """计算每一列的排序结果 {列: (文件夹, 文件)}，可以在后台线程中调用"""
+        folders = cls._sort_group([entry for entry in entries if entry.is_dir])
+        files = cls._sort_group([entry for entry in entries if not entry.is_dir])
+        return {column: (folders[column], files[column]) for column in folders}
+
+    def sort_by(self, column):
+        """按列排序，再次点击同一列时切换升降序"""
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+
+    def sorted_entries(self):
+        """返回排序后的条目，文件夹始终排在文件前面"""
+        folders, files = self.sorted_cache[self.sort_column]
+        if self.sort_reverse:
+            return folders[::-1] + files[::-1]
+        return folders + files
+
+    def rows(self):
+        """当前排序和筛选条件下要显示的条目"""
+        if self.server_side:
+            return list(self.entries)  # NAS已经排好序并筛选过
+        entries = self.sorted_entries()
+        text = self.filter_text.strip().casefold()
+        if text:
+            entries = [entry for entry in entries if text in entry.name_lower]
+        if self.filter_type != 'all':
+            want_dir = self.filter_type == 'dir'
+            entries = [entry for entry in entries if entry.is_dir == want_dir]
+        return entries
+
+
+class VirtualFileView:
+    """虚拟化文件列表 - 全部数据保存在内存模型中，Treeview只保留可见行数（加少量缓冲）的项目，
+    滚动时改写这些项目的内容，因此滚动、选择和重绘的开销与文件夹大小无关"""
+    BUFFER_ROWS = 2       # 可见区域外多保留的行数
+    WHEEL_ROWS = 3        # 鼠标滚轮每格滚动的行数
+    DEFAULT_ROW_HEIGHT = 20
+
+    def __init__(self, tree, scrollbar, render, key=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.render = render              # render(row) -> Treeview.item()的参数字典
+        self.key = key or (lambda row: row)
+        self.rows = []
+        self.top = 0                      # 第一个可见行在模型中的下标
+        self.slots = []                   # 复用的Treeview项目
+        self.slot_rows = []               # 每个项目当前显示的行，未变化的行不重写
+        self.selected = set()             # 选中行的key
+        self.anchor = None                # Shift多选的起点（模型下标）
+        self.on_scroll_end = None         # 滚动到末尾时的回调（用于加载下一页）
+        
+        scrollbar.configure(command=self.yview)
+        tree.bind('<Configure>', lambda e: self.redraw())
+        tree.bind('<MouseWheel>', self.on_mouse_wheel)
+        tree.bind('<Button-4>', lambda e: self.scroll(-self.WHEEL_ROWS))
+        tree.bind('<Button-5>', lambda e: self.scroll(self.WHEEL_ROWS))
+        tree.bind('<Button-1>', self.on_click)
+        tree.bind('<Control-Button-1>', lambda e: self.on_click(e, toggle=True))
+        tree.bind('<Shift-Button-1>', lambda e: self.on_click(e, extend=True))
+        tree.bind('<Up>', lambda e: self.move_selection(-1))
+        tree.bind('<Down>', lambda e: self.move_selection(1))
+        tree.bind('<Prior>', lambda e: self.move_selection(-self.page_size()))
+        tree.bind('<Next>', lambda e: self.move_selection(self.page_size()))
+        tree.bind('<Home>', lambda e: self.move_selection(-len(self.rows)))
+        tree.bind('<End>', lambda e: self.move_selection(len(self.rows)))
+        tree.bind('<Control-a>', self.select_all)
+
+    # ---- 模型 ----
+    def set_rows(self, rows, keep_position=False):
+        """替换全部数据；keep_position为True时保留滚动位置和仍然存在的选中项"""
+        self.rows = rows
+        if keep_position:
+            keys = {self.key(row) for row in rows}
+            self.selected &= keys
+        else:
+            self.top = 0
+            self.selected = set()
+            self.anchor = None
+        self.redraw()
+
+    def clear(self):
+        self.set_rows([])
+
+    def selected_rows(self):
+        """按显示顺序返回选中的行"""
+        if not self.selected:
+            return []
+        return [row for row in self.rows if self.key(row) in self.selected]
+
+    def select_index(self, index, add=False):
+        """选中指定下标的行"""
+        if not add:
+            self.selected = set()
+        self.selected.add(self.key(self.rows[index]))
+        self.anchor = index
+        self.scroll_to(index)
+        self.redraw()
+
+    def index_at(self, y):
+        """返回窗口y坐标处的模型下标，不在数据行上时返回None"""
+        slot = self.tree.identify_row(y)
+        if not slot or slot not in self.slots:
+            return None
+        index = self.top + self.slots.index(slot)
+        return index if index < len(self.rows) else None
+
+    # ---- 滚动 ----
+    def row_height(self):
+        if self.slots:
+            bbox = self.tree.bbox(self.slots[0])
+            if bbox:
+                return max(bbox[3], 1)
+        try:
+            return int(ttk.Style().lookup('Treeview', 'rowheight') or self.DEFAULT_ROW_HEIGHT)
+        except (ValueError, tk.TclError):
+            return self.DEFAULT_ROW_HEIGHT
+
+    def page_size(self):
+        """完整可见的行数"""
+        header = 0
+        if self.slots:
+            bbox = self.tree.bbox(self.slots[0])
+            if bbox:
+                header = bbox[1]
+        return max((self.tree.winfo_height() - header) // self.row_height(), 1)
+
+    def scroll(self, delta):
+        self.top += delta
+        self.redraw()
+        return "break"
+
+    def scroll_to(self, index):
+        """滚动到使指定行可见"""
+        page = self.page_size()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + page:
+            self.top = index - page + 1
+
+    def yview(self, *args):
+        """滚动条回调"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.rows))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            self.top += amount * self.page_size() if args[2] == 'pages' else amount
+        self.redraw()
+
+    def on_mouse_wheel(self, event):
+        steps = -1 if event.delta > 0 else 1
+        if abs(event.delta) >= 120:
+            steps *= abs(event.delta) // 120
+        return self.scroll(steps * self.WHEEL_ROWS)
+
+    # ---- 选择 ----
+    def on_click(self, event, toggle=False, extend=False):
+        if self.tree.identify_region(event.x, event.y) not in ('cell', 'tree'):
+            return None  # 表头等区域交给Treeview默认处理
+        self.tree.focus_set()
+        index = self.index_at(event.y)
+        if index is None:
+            return "break"
+        key = self.key(self.rows[index])
+        if extend and self.anchor is not None and self.anchor < len(self.rows):
+            low, high = sorted((self.anchor, index))
+            self.selected = {self.key(row) for row in self.rows[low:high + 1]}
+        elif toggle:
+            self.selected ^= {key}
+            self.anchor = index
+        else:
+            self.selected = {key}
+            self.anchor = index
+        self.redraw()
+        return "break"
+
+    def move_selection(self, delta):
+        if not self.rows:
+            return "break"
+        current = self.anchor if self.anchor is not None and self.anchor < len(self.rows) else -1
+        index = min(max(current + delta, 0), len(self.rows) - 1)
+        self.select_index(index)
+        return "break"
+
+    def select_all(self, event=None):
+        self.selected = {self.key(row) for row in self.rows}
+        self.redraw()
+        return "break"
+
+    # ---- 绘制 ----
+    def redraw(self, force=False):
+        """只为可见行改写Treeview项目内容；显示的行没有变化时跳过，force为True时全部重写"""
+        total = len(self.rows)
+        page = self.page_size()
+        self.top = max(min(self.top, total - page), 0)
+        needed = max(min(page + self.BUFFER_ROWS, total - self.top), 0)
+        
+        # 调整复用项目的数量
+        while len(self.slots) < needed:
+            self.slots.append(self.tree.insert('', 'end'))
+            self.slot_rows.append(None)
+        if len(self.slots) > needed:
+            self.tree.delete(*self.slots[needed:])
+            del self.slots[needed:]
+            del self.slot_rows[needed:]
+        
+        selected_slots = []
+        for offset, slot in enumerate(self.slots):
+            row = self.rows[self.top + offset]
+            if force or self.slot_rows[offset] is not row:
+                self.tree.item(slot, **self.render(row))
+                self.slot_rows[offset] = row
+            if self.key(row) in self.selected:
+                selected_slots.append(slot)
+        self.tree.selection_set(selected_slots)
+        
+        if total:
+            self.scrollbar.set(self.top / total, min((self.top + page) / total, 1.0))
+            if self.on_scroll_end and self.top + needed >= total:
+                self.on_scroll_end()
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class UIDispatcher:
+    """界面更新调度器 - 工作线程提交的界面更新先放入队列，每帧由Tk线程统一执行一次。
+    带key的更新（状态栏文字、进度条等）在同一帧内只保留最新的一次"""
+    FRAME_MS = 16
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.pending = {}        # key -> 回调，按提交顺序执行
+        self.scheduled = False
+
+    def post(self, callback, key=None):
+        """提交一个界面更新（任何线程都可以调用）"""
+        with self.lock:
+            if key is None:
+                key = object()
+            else:
+                self.pending.pop(key, None)  # 旧值作废，新值排到最后
+            self.pending[key] = callback
+            if self.scheduled:
+                return
+            self.scheduled = True
+        try:
+            self.root.after(self.FRAME_MS, self.flush)
+        except (RuntimeError, tk.TclError):
+            pass  # 窗口已关闭
+
+    def discard(self, key):
+        """丢弃尚未执行的某个key的更新（Tk线程直接更新时调用，避免被旧值覆盖）"""
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def flush(self):
+        """在Tk线程中执行本帧积累的全部更新"""
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+            self.scheduled = False
+        for callback in pending.values():
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠ 界面更新失败: {str(e)}")
+
+
 class SynologyNASManager:
     def __init__(self):
         self.root = tk.Tk()
@@ -286,17 +2210,69 @@ class SynologyNASManager:
         self.session_id = None
         self.api_info = {}
         self.last_login_info = None  # 保存最后一次成功登录的信息
-        self.session = requests.Session()  # 使用Session保持cookie
+        self.session = NASSession()  # 使用Session保持cookie，并负责重试、断路和会话失效时重新登录
+        self.session.reauthenticate = self.reauthenticate
+        self.heartbeat_stop = None  # 会话保活心跳的停止事件
+        self.pending_api_cache = None  # 本次登录使用的API信息缓存，登录后在后台核对
+        self.timeouts = AdaptiveTimeouts()  # 根据实测RTT计算超时
+        self.listing_sizes = {}  # 各文件夹上次列出的项目数，用于放宽列表超时
         
         # 当前路径
         self.current_path = "/"
         
+        # 工作线程的界面更新统一按帧提交给Tk线程
+        self.ui = UIDispatcher(self.root)
+        
         # 显示模式
         self.view_mode = tk.StringVar()
         self.view_mode.set("列表视图")  # 默认为列表视图
         
+        # 文件列表数据模型（排序、筛选）和筛选框内容
+        self.file_model = FileListModel()
+        self.file_filter = tk.StringVar()
+        self.file_filter_type = tk.StringVar(value="全部")
+        self.filter_after_id = None
+        
+        # 传输完成后是否与NAS端MD5比对
+        self.verify_transfers = tk.BooleanVar()
+        
+        # 后台传输限速（列表、缩略图、预览等交互请求不受限制）
+        self.global_limit = tk.StringVar(value="不限速")
+        self.per_transfer_limit = tk.StringVar(value="不限速")
+        self.global_bucket = TokenBucket()
+        self.per_transfer_rate = 0
+        self.transfer_buckets = weakref.WeakSet()
+        
+        # 正在进行的传输（取消事件集合）
+        self.active_transfers = set()
+        self.transfer_lock = threading.Lock()
+        
+        # 批量上传的并发数
+        self.upload_parallelism = tk.IntVar(value=DEFAULT_UPLOAD_PARALLELISM)
+        
+        # 文件夹监视器
+        self.folder_watcher = None
+        
+        # 目录树索引：路径 -> 节点，以及正在展开定位的目标路径
+        self.tree_items = {}
+        self.tree_loading = set()       # 正在加载子目录的路径
+        self.tree_loaded = set()        # 子目录已经加载的路径
+        self.tree_stale = set()         # 已加载但刷新时处于折叠状态的路径，下次展开时再校验
+        self.tree_generation = 0        # 目录树重建时递增，丢弃过期的校验结果
+        self.saved_tree_state = None    # 登出时保存的 (NAS地址, 用户名, 已展开路径)
+        self.tree_target = None
+        self.tree_selected_path = None  # 程序设置的选择，对应的选择事件不再重复加载文件
+        
         # 配置文件路径
         self.config_file = "nas_config.ini"
+        
+        # 传输历史文件，记录每次传输的大小、耗时和平均速度
+        self.transfer_history = TransferHistory("transfer_history.csv")
+        
+        # 未完成传输的日志，重启登录后续传
+        self.transfer_journal = TransferJournal("transfer_journal.db")
+        self.journal_active = set()  # 本次运行中正在处理的日志条目
+        self.shutting_down = False
         self.remember_password = tk.BooleanVar()
         self.selected_profile = tk.StringVar()
         self.profiles = {}  # 存储多个用户配置
@@ -580,10 +2556,25 @@ class SynologyNASManager:
         self.view_combo.pack(side=tk.LEFT)
         self.view_combo.bind('<<ComboboxSelected>>', self.on_view_mode_changed)
         
+        # 筛选框：输入时按文件名筛选当前文件夹
+        ttk.Label(middle_frame, text="筛选:").pack(side=tk.LEFT, padx=(10, 5))
+        self.filter_entry = ttk.Entry(middle_frame, textvariable=self.file_filter, width=16)
+        self.filter_entry.pack(side=tk.LEFT)
+        self.file_filter.trace_add('write', self.on_filter_changed)
+        self.filter_type_combo = ttk.Combobox(middle_frame, textvariable=self.file_filter_type,
+                                              values=list(FileListModel.FILE_TYPES), state='readonly', width=6)
+        self.filter_type_combo.pack(side=tk.LEFT, padx=(5, 0))
+        self.filter_type_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_file_filter())
+        
         # 右侧区域：操作按钮
         right_frame = ttk.Frame(toolbar)
         right_frame.pack(side=tk.RIGHT)
         
+        # 传输校验选项
+        self.verify_cb = ttk.Checkbutton(right_frame, text="MD5校验", variable=self.verify_transfers,
+                                         command=self.save_config)
+        self.verify_cb.pack(side=tk.RIGHT, padx=(5, 0))
+        
         # 下载按钮
         self.download_btn = ttk.Button(right_frame, text="下载文件", command=self.download_file, state='disabled')
         self.download_btn.pack(side=tk.RIGHT, padx=(0, 5))
@@ -592,12 +2583,24 @@ class SynologyNASManager:
         self.upload_btn = ttk.Button(right_frame, text="上传文件", command=self.upload_file, state='disabled')
         self.upload_btn.pack(side=tk.RIGHT, padx=(0, 5))
         
+        # 上传文件夹按钮
+        self.upload_folder_btn = ttk.Button(right_frame, text="上传文件夹", command=self.upload_folder, state='disabled')
+        self.upload_folder_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        
+        # 同步按钮（只上传新增或修改过的文件）
+        self.sync_btn = ttk.Button(right_frame, text="同步上传", command=self.sync_folder, state='disabled')
+        self.sync_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        
+        # 监视文件夹按钮（持续把本地变化推送到NAS）
+        self.watch_btn = ttk.Button(right_frame, text="监视文件夹", command=self.toggle_watch_folder, state='disabled')
+        self.watch_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        
         # 预览按钮
         self.preview_btn = ttk.Button(right_frame, text="预览", command=self.preview_selected_file, state='disabled')
         self.preview_btn.pack(side=tk.RIGHT, padx=(0, 5))
         
         # 刷新按钮
-        self.refresh_btn = ttk.Button(right_frame, text="刷新", command=self.refresh_file_list, state='disabled')
+        self.refresh_btn = ttk.Button(right_frame, text="刷新", command=self.refresh_all, state='disabled')
         self.refresh_btn.pack(side=tk.RIGHT)
         
         # 文件列表
@@ -606,13 +2609,12 @@ class SynologyNASManager:
         
         # 创建Treeview显示文件
         columns = ('name', 'type', 'size', 'modified')
-        self.file_list = ttk.Treeview(list_frame, columns=columns, show='headings', selectmode='browse')
+        self.file_list = ttk.Treeview(list_frame, columns=columns, show='headings', selectmode='extended')
         
-        # 设置列标题
-        self.file_list.heading('name', text='文件名')
-        self.file_list.heading('type', text='类型')
-        self.file_list.heading('size', text='大小')
-        self.file_list.heading('modified', text='修改时间')
+        # 设置列标题，点击标题排序
+        for column in columns:
+            self.file_list.heading(column, command=lambda c=column: self.sort_file_list(c))
+        self.update_sort_headings()
         
         # 设置列宽
         self.file_list.column('name', width=350, minwidth=200)
@@ -620,10 +2622,13 @@ class SynologyNASManager:
         self.file_list.column('size', width=120, minwidth=80)
         self.file_list.column('modified', width=180, minwidth=120)
         
-        # 添加滚动条
-        file_scrollbar_y = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.file_list.yview)
+        # 添加滚动条（纵向滚动由虚拟列表接管）
+        file_scrollbar_y = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
         file_scrollbar_x = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.file_list.xview)
-        self.file_list.configure(yscrollcommand=file_scrollbar_y.set, xscrollcommand=file_scrollbar_x.set)
+        self.file_list.configure(xscrollcommand=file_scrollbar_x.set)
+        self.file_view = VirtualFileView(self.file_list, file_scrollbar_y, self.render_file_row,
+                                         key=lambda entry: entry.name)
+        self.file_view.on_scroll_end = self.load_more_files
         
         # 布局
         self.file_list.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -661,14 +2666,123 @@ class SynologyNASManager:
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(status_frame, variable=self.progress_var, maximum=100)
         
+        # 取消传输按钮 (随进度条显示)
+        self.cancel_btn = ttk.Button(status_frame, text="取消", command=self.cancel_transfers)
+        
+        # 限速设置
+        limit_frame = ttk.Frame(status_frame)
+        limit_frame.grid(row=0, column=3, sticky=tk.E, padx=(10, 0))
+        limit_options = ["不限速", "256 KB/s", "1 MB/s", "5 MB/s", "10 MB/s", "50 MB/s"]
+        
+        ttk.Label(limit_frame, text="总限速:").pack(side=tk.LEFT, padx=(0, 5))
+        self.global_limit_combo = ttk.Combobox(limit_frame, textvariable=self.global_limit,
+                                               values=limit_options, width=9)
+        self.global_limit_combo.pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Label(limit_frame, text="单任务限速:").pack(side=tk.LEFT, padx=(0, 5))
+        self.per_transfer_limit_combo = ttk.Combobox(limit_frame, textvariable=self.per_transfer_limit,
+                                                     values=limit_options, width=9)
+        self.per_transfer_limit_combo.pack(side=tk.LEFT)
+        
+        ttk.Label(limit_frame, text="上传并发:").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Spinbox(limit_frame, from_=1, to=MAX_UPLOAD_PARALLELISM, textvariable=self.upload_parallelism,
+                    width=3, command=self.save_config).pack(side=tk.LEFT)
+        
+        for combo in (self.global_limit_combo, self.per_transfer_limit_combo):
+            combo.bind('<<ComboboxSelected>>', self.on_bandwidth_limit_changed)
+            combo.bind('<Return>', self.on_bandwidth_limit_changed)
+            combo.bind('<FocusOut>', self.on_bandwidth_limit_changed)
+        
     def show_progress(self, show=True):
         """显示或隐藏进度条"""
         if show:
             self.progress_bar.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
+            self.cancel_btn.grid(row=0, column=2, padx=(5, 0))
             self.status_label.grid(row=0, column=0, sticky=tk.W)
         else:
             self.progress_bar.grid_remove()
-            
+            self.cancel_btn.grid_remove()
+
+    def begin_transfer(self):
+        """登记一个正在进行的传输，返回用于取消它的事件"""
+        cancel_event = threading.Event()
+        with self.transfer_lock:
+            self.active_transfers.add(cancel_event)
+        return cancel_event
+
+    def hide_progress_if_idle(self):
+        """一个任务结束时，只有没有其它传输在进行才隐藏并重置进度条"""
+        with self.transfer_lock:
+            busy = bool(self.active_transfers)
+        if not busy:
+            self.show_progress(False)
+            self.progress_var.set(0)
+
+    def end_transfer(self, cancel_event):
+        """传输结束后注销"""
+        with self.transfer_lock:
+            self.active_transfers.discard(cancel_event)
+
+    def cancel_transfers(self):
+        """取消所有正在进行的上传和下载"""
+        with self.transfer_lock:
+            events = list(self.active_transfers)
+        for cancel_event in events:
+            cancel_event.set()
+        if events:
+            self.update_status("正在取消传输...")
+
+    def parse_bandwidth_limit(self, text):
+        """解析限速文本为每秒字节数，0表示不限速，纯数字按KB/s处理"""
+        text = text.strip().upper().replace(' ', '')
+        if not text or text in ("不限速", "0"):
+            return 0
+        if text.endswith('/S'):
+            text = text[:-2]
+        units = {'GB': 1024 ** 3, 'MB': 1024 ** 2, 'KB': 1024, 'G': 1024 ** 3, 'M': 1024 ** 2, 'K': 1024, 'B': 1}
+        multiplier = 1024
+        for unit, value in units.items():
+            if text.endswith(unit):
+                text = text[:-len(unit)]
+                multiplier = value
+                break
+        # inf、nan以及乘上单位后溢出的值都视为格式无效
+        rate = float(text) * multiplier
+        if not math.isfinite(rate) or rate < 0:
+            raise ValueError(text)
+        return int(rate)
+
+    def apply_bandwidth_limits(self):
+        """将界面上的限速设置应用到令牌桶，正在进行的传输立即生效"""
+        try:
+            global_rate = self.parse_bandwidth_limit(self.global_limit.get())
+            per_transfer_rate = self.parse_bandwidth_limit(self.per_transfer_limit.get())
+        except ValueError:
+            return False
+
+        self.global_bucket.set_rate(global_rate)
+        self.per_transfer_rate = per_transfer_rate
+        for bucket in list(self.transfer_buckets):
+            bucket.set_rate(per_transfer_rate)
+        return True
+
+    def on_bandwidth_limit_changed(self, event=None):
+        """限速设置改变事件"""
+        if not self.apply_bandwidth_limits():
+            messagebox.showwarning("提示", "限速格式无效，例如: 512 KB/s、2 MB/s 或 不限速")
+            if event is None or event.widget == self.global_limit_combo:
+                self.global_limit.set("不限速")
+            if event is None or event.widget == self.per_transfer_limit_combo:
+                self.per_transfer_limit.set("不限速")
+            self.apply_bandwidth_limits()
+        self.save_config()
+
+    def create_transfer_throttle(self):
+        """为一个传输任务创建限速器，返回需要依次消耗令牌的令牌桶"""
+        bucket = TokenBucket(self.per_transfer_rate)
+        self.transfer_buckets.add(bucket)
+        return (bucket, self.global_bucket)
+
     def login(self):
         """登录到NAS"""
         nas_url = self.nas_url.get().strip()
@@ -696,68 +2810,77 @@ class SynologyNASManager:
             self.update_status("正在连接到NAS...")
             self.login_btn.configure(state='disabled')
             
-            # 第一步：获取API信息
-            api_url = f"{self.nas_url.get()}/webapi/query.cgi"
-            params = {
-                'api': 'SYNO.API.Info',
-                'version': '1',
-                'method': 'query',
-                'query': 'SYNO.API.Auth,SYNO.FileStation.List,SYNO.FileStation.Upload,SYNO.FileStation.Download'
-            }
-            
-            response = self.session.get(api_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
-            if not result.get('success'):
-                raise Exception(f"获取API信息失败: {result.get('error', {})}")
-                
-            self.api_info = result['data']
-            
-            # 第二步：登录认证 - 使用Cookie格式
-            auth_url = f"{self.nas_url.get()}/webapi/auth.cgi"
-            auth_params = {
-                'api': 'SYNO.API.Auth',
-                'version': '7',  # 使用最高版本
-                'method': 'login',
-                'account': self.username.get(),
-                'passwd': self.password.get(),
-                'session': 'FileStation',
-                'format': 'cookie'  # 使用cookie格式而不是sid
-            }
-            
-            auth_response = self.session.get(auth_url, params=auth_params, timeout=10)
-            auth_response.raise_for_status()
-            
-            auth_result = auth_response.json()
-            if not auth_result.get('success'):
-                error_code = auth_result.get('error', {}).get('code', 'unknown')
-                error_messages = {
-                    400: "账号或密码错误",
-                    401: "账号已被禁用",
-                    402: "权限不足",
-                    403: "需要双重验证",
-                    404: "双重验证码错误"
-                }
-                error_msg = error_messages.get(error_code, f"登录失败，错误代码: {error_code}")
-                raise Exception(error_msg)
-                
-            # Cookie认证不需要保存SID，Session会自动管理
-            self.session_id = "cookie_auth"  # 标记使用cookie认证
+            # 第一步：获取API信息，配置中有未过期的缓存时跳过查询
+            api_cache = self.load_api_cache()
+            if api_cache:
+                self.api_info = api_cache['apis']
+                print("✓ 使用缓存的API信息")
+            else:
+                self.api_info = self.query_api_info()
+            self.pending_api_cache = api_cache
+            
+            # 有保存的会话cookie时直接复用，跳过登录；cookie已失效时第一次请求会自动重新登录
+            cookies = self.load_session_cookie()
+            if cookies:
+                self.session.cookies.update(cookies)
+                self.session_id = "cookie_auth"
+                print("✓ 复用已保存的会话，跳过登录")
+                self.ui.post(self._on_login_success)
+                return
             
-            # 验证登录后的会话是否有效
-            if not self.verify_session():
-                raise Exception("登录成功但会话验证失败，请检查账户权限")
+            # 第二步：登录认证
+            try:
+                self._authenticate()
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                raise
+            except Exception as e:
+                if not api_cache or (isinstance(e, NASAPIError) and e.code in LOGIN_ERROR_MESSAGES):
+                    raise
+                # 缓存的API路径或版本可能已因DSM升级失效：删除缓存，重新查询后再试一次
+                print(f"⚠ 使用缓存的API信息登录失败，重新查询API信息后重试: {e}")
+                self.ui.post(self.clear_api_cache)
+                self.api_info = self.query_api_info()
+                self.pending_api_cache = None
+                self._authenticate()
             
             # 登录成功，更新UI
-            self.root.after(0, self._on_login_success)
+            self.ui.post(self._on_login_success)
             
         except requests.exceptions.Timeout:
-            self.root.after(0, lambda: self._on_login_error("连接超时，请检查NAS地址"))
+            self.ui.post(lambda: self._on_login_error("连接超时，请检查NAS地址"))
         except requests.exceptions.ConnectionError:
-            self.root.after(0, lambda: self._on_login_error("无法连接到NAS，请检查地址和端口"))
+            self.ui.post(lambda: self._on_login_error("无法连接到NAS，请检查地址和端口"))
         except Exception as e:
-            self.root.after(0, lambda: self._on_login_error(str(e)))
+            error_msg = str(e)
+            self.ui.post(lambda: self._on_login_error(error_msg))
+    
+    def _authenticate(self):
+        """用账号密码登录认证（使用Cookie格式）并验证会话"""
+        auth_url = f"{self.nas_url.get()}/webapi/auth.cgi"
+        auth_params = {
+            'api': 'SYNO.API.Auth',
+            'version': self.api_version('SYNO.API.Auth'),  # 协商后的版本
+            'method': 'login',
+            'account': self.username.get(),
+            'passwd': self.password.get(),
+            'session': 'FileStation',
+            'format': 'cookie'  # 使用cookie格式而不是sid
+        }
+        
+        auth_response = self.session.get(auth_url, params=auth_params, timeout=self.timeouts.for_api())
+        auth_response.raise_for_status()
+        
+        auth_result = auth_response.json()
+        if not auth_result.get('success'):
+            error_code = auth_result.get('error', {}).get('code', 'unknown')
+            raise NASAPIError(LOGIN_ERROR_MESSAGES.get(error_code, f"登录失败，错误代码: {error_code}"), error_code)
+        
+        # Cookie认证不需要保存SID，Session会自动管理
+        self.session_id = "cookie_auth"  # 标记使用cookie认证
+        
+        # 验证登录后的会话是否有效
+        if not self.verify_session():
+            raise Exception("登录成功但会话验证失败，请检查账户权限")
             
     def _on_login_success(self):
         """登录成功回调"""
@@ -775,11 +2898,21 @@ class SynologyNASManager:
         # 保存全局配置
         self.save_config()
         
+        # 保存会话cookie供下次启动复用，并启动保活心跳
+        self.save_session_cookie()
+        self.start_heartbeat()
+        
+        # 后台核对/更新API信息缓存
+        threading.Thread(target=self._validate_api_cache_thread, args=(self.pending_api_cache,), daemon=True).start()
+        
         self.update_status("连接成功")
         self.connection_status.configure(text=f"已连接到 {self.nas_url.get()}", style='Success.TLabel')
         self.login_btn.configure(state='disabled')
         self.logout_btn.configure(state='normal')
         self.upload_btn.configure(state='normal')
+        self.upload_folder_btn.configure(state='normal')
+        self.sync_btn.configure(state='normal')
+        self.watch_btn.configure(state='normal')
         self.download_btn.configure(state='normal')
         self.refresh_btn.configure(state='normal')
         self.preview_btn.configure(state='normal')
@@ -788,6 +2921,9 @@ class SynologyNASManager:
         # 加载共享文件夹
         self.load_shared_folders()
         
+        # 继续上次未完成的传输
+        self.resume_pending_transfers()
+        
     def _on_login_error(self, error_msg):
         """登录失败回调"""
         self.update_status("连接失败")
@@ -806,13 +2942,14 @@ class SynologyNASManager:
             url = f"{self.nas_url.get()}/webapi/{list_api_path}"
             params = {
                 'api': 'SYNO.FileStation.List',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.List'),
                 'method': 'list_share',
                 'limit': '1'  # 只获取1个项目用于验证
                 # 不传_sid，使用session的cookie
             }
             
-            response = self.session.get(url, params=params, timeout=5)
+            response = self.session.get(url, params=params, timeout=self.timeouts.for_api())
+            self.timeouts.record(response.elapsed.total_seconds())
             result = response.json()
             
             # 如果返回成功，说明会话有效
@@ -821,21 +2958,16 @@ class SynologyNASManager:
         except:
             return False
     
-    def refresh_session_if_needed(self):
-        """验证会话，如果需要则刷新SID"""
+    def reauthenticate(self):
+        """用保存的登录信息重新登录（API返回会话失效时由NASSession调用）"""
         if not self.session_id or not self.last_login_info:
             return False
             
-        # 先验证当前会话
-        if self.verify_session():
-            return True
-            
-        # 会话无效，尝试重新登录
         try:
-            auth_url = f"{self.nas_url.get()}/webapi/auth.cgi"
+            auth_url = f"{self.last_login_info['nas_url']}/webapi/auth.cgi"
             auth_params = {
                 'api': 'SYNO.API.Auth',
-                'version': '7',
+                'version': self.api_version('SYNO.API.Auth'),
                 'method': 'login',
                 'account': self.last_login_info['username'],
                 'passwd': self.last_login_info['password'],
@@ -843,11 +2975,12 @@ class SynologyNASManager:
                 'format': 'cookie'
             }
             
-            auth_response = self.session.get(auth_url, params=auth_params, timeout=10)
+            auth_response = self.session.get(auth_url, params=auth_params, timeout=self.timeouts.for_api())
             auth_result = auth_response.json()
             
             if auth_result.get('success'):
                 self.session_id = "cookie_auth"  # 标记使用cookie认证
+                self.ui.post(self.save_session_cookie)  # cookie已更换
                 return True
             else:
                 return False
@@ -855,32 +2988,175 @@ class SynologyNASManager:
         except:
             return False
     
-    def try_auto_login(self):
-        """尝试自动重新登录"""
-        if not self.last_login_info:
-            messagebox.showerror("错误", "无法自动重新登录，请手动重新连接")
-            return False
-            
+    def api_version(self, api):
+        """协商API版本：客户端支持的最高版本与NAS的maxVersion取较小值，且不低于minVersion"""
+        version = API_VERSIONS.get(api, 1)
+        info = self.api_info.get(api)
+        if info:
+            version = max(min(version, int(info.get('maxVersion', version))), int(info.get('minVersion', 1)))
+        return str(version)
+
+    def load_api_cache(self):
+        """读取当前配置中缓存的API信息，NAS地址不一致、查询的API列表变化或超过有效期时返回None"""
+        profile = self.profiles.get(self.selected_profile.get(), {})
         try:
-            self.update_status("正在自动重新登录...")
-            
-            # 恢复登录信息
-            self.nas_url.set(self.last_login_info['nas_url'])
-            self.username.set(self.last_login_info['username'])
-            self.password.set(self.last_login_info['password'])
-            
-            # 禁用登录按钮，避免重复点击
-            self.login_btn.configure(state='disabled')
-            
-            # 尝试重新登录
-            threading.Thread(target=self._login_thread, daemon=True).start()
-            return True
+            cache = json.loads(profile.get('api_cache', '') or '{}')
+        except ValueError:
+            return None
+        if (cache.get('nas_url') != self.nas_url.get() or cache.get('query') != API_INFO_QUERY
+                or time.time() - cache.get('cached_at', 0) > API_INFO_TTL or not cache.get('apis')):
+            return None
+        return cache
+
+    def save_api_cache(self, apis, fingerprint):
+        """把API信息和DSM版本指纹缓存到当前配置"""
+        profile_name = self.selected_profile.get()
+        if profile_name not in self.profiles:
+            return
+        self.profiles[profile_name]['api_cache'] = json.dumps({
+            'nas_url': self.nas_url.get(),
+            'query': API_INFO_QUERY,
+            'fingerprint': fingerprint,
+            'cached_at': int(time.time()),
+            'apis': apis
+        }, separators=(',', ':'))
+        self.save_config()
+
+    def clear_api_cache(self):
+        """删除当前配置中缓存的API信息"""
+        profile = self.profiles.get(self.selected_profile.get())
+        if profile and profile.get('api_cache'):
+            profile['api_cache'] = ''
+            self.save_config()
+
+    def query_api_info(self):
+        """通过SYNO.API.Info查询API路径和版本范围"""
+        api_url = f"{self.nas_url.get()}/webapi/query.cgi"
+        params = {
+            'api': 'SYNO.API.Info',
+            'version': '1',
+            'method': 'query',
+            'query': API_INFO_QUERY
+        }
+        
+        response = self.session.get(api_url, params=params, timeout=self.timeouts.for_api())
+        response.raise_for_status()
+        self.timeouts.record(response.elapsed.total_seconds())
+        
+        result = response.json()
+        if not result.get('success'):
+            raise Exception(f"获取API信息失败: {result.get('error', {})}")
+        return result['data']
+
+    def get_dsm_fingerprint(self):
+        """获取DSM版本字符串作为API缓存的指纹，失败时返回空字符串"""
+        try:
+            api_path = self.api_info.get('SYNO.DSM.Info', {}).get('path', 'entry.cgi')
+            params = {
+                'api': 'SYNO.DSM.Info',
+                'version': self.api_version('SYNO.DSM.Info'),
+                'method': 'getinfo'
+            }
+            response = self.session.get(f"{self.nas_url.get()}/webapi/{api_path}", params=params,
+                                        timeout=self.timeouts.for_api())
+            result = response.json()
+            if result.get('success'):
+                data = result.get('data', {})
+                return str(data.get('version_string') or data.get('version') or '')
         except Exception as e:
-            self.update_status(f"自动重新登录失败: {str(e)}")
-            messagebox.showerror("自动登录失败", f"自动重新登录失败，请手动重新连接\n错误: {str(e)}")
-            self.login_btn.configure(state='normal')
-            return False
-    
+            print(f"⚠ 获取DSM版本失败: {e}")
+        return ''
+
+    def _validate_api_cache_thread(self, cache):
+        """登录后在后台核对DSM版本，DSM升级（指纹变化）或没有缓存时重新查询并更新缓存"""
+        fingerprint = self.get_dsm_fingerprint()
+        # 取不到版本（空指纹）时无法判断DSM是否升级，继续使用缓存
+        if cache and (not fingerprint or cache.get('fingerprint') == fingerprint):
+            return
+        try:
+            apis = self.api_info
+            if cache:
+                # 使用的是缓存且DSM版本已变化，重新查询
+                print(f"⚠ DSM版本已变化 ({cache.get('fingerprint')} → {fingerprint})，重新查询API信息")
+                apis = self.query_api_info()
+                self.api_info = apis
+            self.ui.post(lambda: self.save_api_cache(apis, fingerprint))
+        except Exception as e:
+            print(f"⚠ 更新API信息缓存失败: {e}")
+
+    def save_session_cookie(self):
+        """把当前会话cookie加密保存到配置中，下次启动可跳过登录直接复用（仅在记住密码时保存）"""
+        profile_name = self.selected_profile.get()
+        if profile_name not in self.profiles or not self.remember_password.get():
+            return
+        cookies = requests.utils.dict_from_cookiejar(self.session.cookies)
+        session_data = ''
+        if cookies:
+            session_data = self.encrypt_password(json.dumps({
+                'nas_url': self.nas_url.get(),
+                'username': self.username.get(),
+                'cookies': cookies
+            }))
+        if self.profiles[profile_name].get('session', '') != session_data:
+            self.profiles[profile_name]['session'] = session_data
+            self.save_config()
+
+    def load_session_cookie(self):
+        """读取当前配置中保存的会话cookie，NAS地址或用户名不一致时返回None"""
+        if not self.remember_password.get():
+            return None
+        profile = self.profiles.get(self.selected_profile.get(), {})
+        encrypted = profile.get('session', '')
+        if not encrypted:
+            return None
+        try:
+            session_data = json.loads(self.decrypt_password(encrypted) or '{}')
+        except ValueError:
+            return None
+        if (session_data.get('nas_url') != self.nas_url.get()
+                or session_data.get('username') != self.username.get()):
+            return None
+        return session_data.get('cookies') or None
+
+    def clear_session_cookie(self):
+        """会话已在NAS端结束，删除保存的cookie"""
+        profile = self.profiles.get(self.selected_profile.get())
+        if profile and profile.get('session'):
+            profile['session'] = ''
+            self.save_config()
+
+    def start_heartbeat(self):
+        """启动会话保活心跳"""
+        self.stop_heartbeat()
+        self.heartbeat_stop = threading.Event()
+        threading.Thread(target=self._heartbeat_thread, args=(self.heartbeat_stop,), daemon=True).start()
+
+    def stop_heartbeat(self):
+        """停止会话保活心跳"""
+        if self.heartbeat_stop:
+            self.heartbeat_stop.set()
+            self.heartbeat_stop = None
+
+    def _heartbeat_thread(self, stop_event):
+        """心跳线程 - 只有空闲超过HEARTBEAT_INTERVAL时才发送一个很小的请求，让会话不因空闲而过期"""
+        while not stop_event.wait(HEARTBEAT_CHECK_INTERVAL):
+            if not self.session_id:
+                continue
+            if time.monotonic() - self.session.last_activity < HEARTBEAT_INTERVAL:
+                continue
+            try:
+                api_path = self.api_info.get('SYNO.FileStation.Info', {}).get('path', 'entry.cgi')
+                params = {
+                    'api': 'SYNO.FileStation.Info',
+                    'version': self.api_version('SYNO.FileStation.Info'),
+                    'method': 'get'
+                }
+                # 会话已过期时NASSession会自动重新登录
+                self.session.get(f"{self.nas_url.get()}/webapi/{api_path}", params=params,
+                                 timeout=self.timeouts.for_api())
+            except Exception as e:
+                print(f"⚠ 会话心跳失败: {e}")
+
     def generate_key(self, password_hash):
         """根据密码哈希生成加密密钥"""
         # 使用密码哈希的前32位作为密钥
@@ -935,7 +3211,11 @@ class SynologyNASManager:
             # 保存最后选择的配置
             config['SETTINGS'] = {
                 'last_profile': self.selected_profile.get(),
-                'remember_password': str(self.remember_password.get())
+                'remember_password': str(self.remember_password.get()),
+                'verify_transfers': str(self.verify_transfers.get()),
+                'global_limit': self.global_limit.get(),
+                'per_transfer_limit': self.per_transfer_limit.get(),
+                'upload_parallelism': str(self.get_upload_parallelism())
             }
             
             # 保存所有用户配置
@@ -963,6 +3243,11 @@ class SynologyNASManager:
                 settings = config['SETTINGS']
                 remember = settings.getboolean('remember_password', False)
                 self.remember_password.set(remember)
+                self.verify_transfers.set(settings.getboolean('verify_transfers', False))
+                self.global_limit.set(settings.get('global_limit', '不限速'))
+                self.per_transfer_limit.set(settings.get('per_transfer_limit', '不限速'))
+                self.apply_bandwidth_limits()
+                self.upload_parallelism.set(settings.getint('upload_parallelism', DEFAULT_UPLOAD_PARALLELISM))
                 last_profile = settings.get('last_profile', '')
             else:
                 last_profile = ''
@@ -1009,11 +3294,13 @@ class SynologyNASManager:
         current_profile = self.selected_profile.get()
         if current_profile and current_profile != "新建配置..." and current_profile in self.profiles:
             # 静默保存，不显示提示
-            profile_data = {
+            # 保留会话cookie、API缓存等附加信息
+            profile_data = dict(self.profiles[current_profile])
+            profile_data.update({
                 'nas_url': self.nas_url.get(),
                 'username': self.username.get(),
                 'password': ''
-            }
+            })
             
             # 如果记住密码，则加密保存
             if self.remember_password.get():
@@ -1127,11 +3414,13 @@ class SynologyNASManager:
             return
         
         # 保存当前输入的信息
-        profile_data = {
+        # 保留会话cookie、API缓存等附加信息
+        profile_data = dict(self.profiles.get(current_profile, {}))
+        profile_data.update({
             'nas_url': nas_url,
             'username': username,
             'password': ''
-        }
+        })
         
         # 如果记住密码，则加密保存
         if self.remember_password.get() and password:
@@ -1213,23 +3502,29 @@ class SynologyNASManager:
             
             messagebox.showinfo("完成", "所有配置已清除！")
     
-    def logout(self):
-        """登出"""
-        if self.session_id:
+    def logout(self, end_session=True):
+        """登出；end_session为False时只断开本地连接，保留NAS端会话供下次启动复用"""
+        self.stop_heartbeat()
+        if self.session_id and end_session:
             try:
                 # 发送登出请求
                 logout_url = f"{self.nas_url.get()}/webapi/auth.cgi"
                 params = {
                     'api': 'SYNO.API.Auth',
-                    'version': '1',
+                    'version': self.api_version('SYNO.API.Auth'),
                     'method': 'logout',
                     'session': 'FileStation'
                     # 不传_sid，使用session的cookie
                 }
-                self.session.get(logout_url, params=params, timeout=5)
+                self.session.get(logout_url, params=params, timeout=self.timeouts.for_api(), idempotent=False)
             except:
                 pass  # 忽略登出错误
+            self.session.cookies.clear()
+            self.clear_session_cookie()
                 
+        # 停止文件夹监视
+        self.stop_watch_folder()
+        
         # 重置状态
         self.session_id = None
         self.current_path = "/"
@@ -1244,14 +3539,26 @@ class SynologyNASManager:
         self.login_btn.configure(state='normal')
         self.logout_btn.configure(state='disabled')
         self.upload_btn.configure(state='disabled')
+        self.upload_folder_btn.configure(state='disabled')
+        self.sync_btn.configure(state='disabled')
+        self.watch_btn.configure(state='disabled')
         self.download_btn.configure(state='disabled')
         self.refresh_btn.configure(state='disabled')
         self.preview_btn.configure(state='disabled')
         self.view_combo.configure(state='disabled')
         
-        # 清空列表
+        # 清空列表（保存已展开的目录，重新登录同一NAS时恢复）
+        self.saved_tree_state = (self.nas_url.get(), self.username.get(), self.open_tree_paths())
         self.dir_tree.delete(*self.dir_tree.get_children())
-        self.file_list.delete(*self.file_list.get_children())
+        self.tree_items = {}
+        self.tree_loaded = set()
+        self.tree_stale = set()
+        self.tree_loading = set()
+        self.tree_generation += 1
+        self.tree_target = None
+        self.file_model.generation += 1
+        self.file_model.set_entries(None, [])
+        self.file_view.clear()
         self.path_label.configure(text="/")
         
         self.update_status("已断开连接")
@@ -1275,13 +3582,14 @@ class SynologyNASManager:
             url = f"{self.nas_url.get()}/webapi/{list_api_path}"
             params = {
                 'api': 'SYNO.FileStation.List',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.List'),
                 'method': 'list_share'
                 # 不传_sid，使用session的cookie
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self.session.get(url, params=params, timeout=self.timeouts.for_api())
             response.raise_for_status()
+            self.timeouts.record(response.elapsed.total_seconds())
             
             result = response.json()
             if not result.get('success'):
@@ -1290,30 +3598,150 @@ class SynologyNASManager:
             shares = result['data']['shares']
             
             # 更新UI
-            self.root.after(0, lambda: self._update_directory_tree(shares))
+            self.ui.post(lambda: self._update_directory_tree(shares))
+            
+            # 探测各共享文件夹是否有子文件夹，决定是否显示展开箭头
+            hints = self.probe_subfolders([share['path'] for share in shares[:TREE_PROBE_LIMIT]])
+            self.ui.post(lambda: self._apply_children_hints(hints))
             
         except Exception as e:
-            self.root.after(0, lambda: self.update_status(f"加载文件夹失败: {str(e)}"))
+            self.update_status(f"加载文件夹失败: {str(e)}")
             
     def _update_directory_tree(self, shares):
-        """更新目录树"""
+        """更新目录树 - 已有目录树时只增删变化的共享文件夹，并在后台重新校验已展开的节点"""
+        root_item = self.tree_items.get('/')
+        if root_item is not None and self.dir_tree.exists(root_item):
+            self._reconcile_tree_children(root_item, [(share['name'], share['path']) for share in shares])
+            # 折叠的已加载节点等到下次展开时再校验
+            open_paths = self.open_tree_paths()
+            self.tree_stale = self.tree_loaded - set(open_paths) - {'/'}
+            self.revalidate_tree(open_paths)
+            self.update_status("文件夹加载完成")
+            return
+        
         # 清空现有项目
         self.dir_tree.delete(*self.dir_tree.get_children())
+        self.tree_loading = set()
+        self.tree_generation += 1
         
         # 添加根节点
         root_item = self.dir_tree.insert('', 'end', text='/', values=['/'], open=True)
+        self.tree_items = {'/': root_item}
+        self.tree_loaded = {'/'}
+        self.tree_stale = set()
         
-        # 添加共享文件夹
-        for share in shares:
-            share_name = share['name']
-            share_path = share['path']
-            # 为每个共享文件夹添加一个占位符子节点，以便显示展开箭头
-            folder_icon = self.folder_icons.get('folder_closed_tree', '')
-            share_item = self.dir_tree.insert(root_item, 'end', text=share_name, values=[share_path], image=folder_icon)
-            # 添加一个占位符，让文件夹显示展开箭头
-            self.dir_tree.insert(share_item, 'end', text='<loading...>', values=[''])
+        # 添加共享文件夹（是否有子文件夹由后台探测后再显示展开箭头）
+        for index, share in enumerate(shares):
+            self._insert_tree_folder(root_item, share['name'], share['path'], index < TREE_PROBE_LIMIT)
+        
+        # 重新登录同一NAS时恢复之前展开的目录
+        if self.saved_tree_state and self.saved_tree_state[:2] == (self.nas_url.get(), self.username.get()):
+            self.revalidate_tree(self.saved_tree_state[2], restore_open=True)
+        self.saved_tree_state = None
             
         self.update_status("文件夹加载完成")
+    
+    def open_tree_paths(self):
+        """已加载且处于展开状态的目录路径（不含根节点）"""
+        return [path for path in self.tree_loaded
+                if path != '/' and path in self.tree_items and self.dir_tree.item(self.tree_items[path], 'open')]
+    
+    def tree_child_names(self, path):
+        """目录树中某个路径下已有的子文件夹名称"""
+        item = self.tree_items.get(path)
+        if item is None:
+            return set()
+        return {self.dir_tree.item(child, 'text') for child in self.dir_tree.get_children(item)
+                if self.dir_tree.item(child, 'values')[0]}
+    
+    def revalidate_tree(self, paths, restore_open=False):
+        """在后台并发重新列出这些已展开目录的子文件夹，再就地增删变化的节点。
+        restore_open为True时（重新登录后恢复）把这些目录重新展开"""
+        # 正在加载的目录会得到最新结果，不重复列出；校验期间这些目录也不会再被展开加载
+        paths = [path for path in paths if path not in self.tree_loading]
+        if not paths:
+            return
+        self.tree_loading.update(paths)
+        known = {path: self.tree_child_names(path) for path in paths}
+        threading.Thread(target=self._revalidate_tree_thread, args=(known, self.tree_generation, restore_open),
+                         daemon=True).start()
+    
+    def _revalidate_tree_thread(self, known, generation, restore_open):
+        """目录树校验线程"""
+        def list_children(path):
+            try:
+                return [dir_info['name'] for dir_info in self.list_subfolders(path)]
+            except Exception as e:
+                print(f"⚠ 刷新目录失败 {path}: {str(e)}")
+                return None
+        
+        paths = list(known)
+        with ThreadPoolExecutor(max_workers=TREE_PROBE_PARALLELISM) as executor:
+            listings = dict(zip(paths, executor.map(list_children, paths)))
+        
+        # 只为新出现的子文件夹探测是否有下级
+        new_children = []
+        for path, names in listings.items():
+            if names is None:
+                continue
+            for name in names[:TREE_PROBE_LIMIT]:
+                child_path = f"{path.rstrip('/')}/{name}"
+                if name not in known[path] and child_path not in known:
+                    new_children.append(child_path)
+        hints = self.probe_subfolders(new_children)
+        
+        self.ui.post(lambda: self._apply_tree_revalidation(listings, hints, generation, restore_open))
+    
+    def _apply_tree_revalidation(self, listings, hints, generation, restore_open):
+        """把校验结果应用到目录树（上级目录先处理，以便恢复多层展开的目录）"""
+        if generation != self.tree_generation:
+            return
+        self.tree_loading.difference_update(listings)
+        for path in sorted(listings, key=lambda p: p.count('/')):
+            names = listings[path]
+            item = self.tree_items.get(path)
+            if names is None or item is None:
+                continue
+            self._reconcile_tree_children(item, [(name, f"{path.rstrip('/')}/{name}") for name in names])
+            self.tree_loaded.add(path)
+            self.tree_stale.discard(path)
+            if restore_open:
+                self.dir_tree.item(item, open=True)
+        self._apply_children_hints(hints)
+        
+        # 正在定位的路径经过刚校验完的目录时继续向下展开
+        if self.tree_target and any(self.tree_target.startswith(path.rstrip('/') + '/') for path in listings):
+            self.update_tree_selection(self.tree_target)
+    
+    def _reconcile_tree_children(self, item, children):
+        """让节点的子节点与 [(名称, 路径)] 一致：删除消失的，插入新增的，保留未变化节点（及其展开状态）"""
+        existing = {}
+        for child in self.dir_tree.get_children(item):
+            child_path = self.dir_tree.item(child, 'values')[0]
+            if child_path:
+                existing[child_path] = child
+            else:
+                self.dir_tree.delete(child)  # 占位符
+        
+        wanted = {path for name, path in children}
+        for child_path, child in existing.items():
+            if child_path not in wanted:
+                self._remove_tree_item(child_path, child)
+        
+        for index, (name, path) in enumerate(children):
+            child = existing.get(path)
+            if child is None:
+                child = self._insert_tree_folder(item, name, path, index < TREE_PROBE_LIMIT)
+            self.dir_tree.move(child, item, index)
+    
+    def _remove_tree_item(self, path, item):
+        """删除节点，并从路径索引中移除它和它的所有下级"""
+        prefix = path.rstrip('/') + '/'
+        for indexed in [p for p in self.tree_items if p == path or p.startswith(prefix)]:
+            del self.tree_items[indexed]
+            self.tree_loaded.discard(indexed)
+            self.tree_stale.discard(indexed)
+        self.dir_tree.delete(item)
         
     def on_directory_select(self, event):
         """目录选择事件"""
@@ -1323,6 +3751,10 @@ class SynologyNASManager:
             
         item = selection[0]
         values = self.dir_tree.item(item, 'values')
+        if values and values[0] == self.tree_selected_path:
+            # 由update_tree_selection设置的选择，文件列表已经在加载
+            self.tree_selected_path = None
+            return
         if values and values[0]:  # 确保路径不为空
             self.current_path = values[0]
             self.path_label.configure(text=self.current_path)
@@ -1330,92 +3762,154 @@ class SynologyNASManager:
     
     def on_directory_expand(self, event):
         """目录展开事件"""
-        selection = self.dir_tree.selection()
-        if not selection:
-            return
-            
-        item = selection[0]
+        # 展开的节点是焦点节点（点击展开箭头不会改变选择）
+        item = self.dir_tree.focus()
+        if item:
+            self.expand_tree_item(item)
+    
+    def expand_tree_item(self, item):
+        """展开节点，子目录尚未加载时开始加载。返回True表示已开始加载"""
         values = self.dir_tree.item(item, 'values')
         if not values or not values[0]:
-            return
-            
-        # 检查是否已经加载了子目录
-        children = self.dir_tree.get_children(item)
-        if children and len(children) == 1:
-            # 检查是否是占位符
-            child_text = self.dir_tree.item(children[0], 'text')
-            if child_text == '<loading...>':
-                # 删除占位符并加载真实的子目录
-                self.dir_tree.delete(children[0])
-                self.load_subdirectories(item, values[0])
+            return False
+        path = values[0]
+        
+        # 检查是否已经加载了子目录；刷新后未校验过的节点在后台重新校验
+        if path in self.tree_stale:
+            self.tree_stale.discard(path)
+            self.revalidate_tree([path])
+        if path in self.tree_loaded or path in self.tree_loading:
+            return False
+        # 删除占位符并加载真实的子目录
+        self.dir_tree.delete(*self.dir_tree.get_children(item))
+        self.load_subdirectories(item, path)
+        return True
+    
+    def _insert_tree_folder(self, parent_item, name, path, probed):
+        """在目录树中插入一个文件夹节点；未探测的文件夹先加占位符以显示展开箭头"""
+        folder_icon = self.folder_icons.get('folder_closed_tree', '')
+        item = self.dir_tree.insert(parent_item, 'end', text=name, values=[path], image=folder_icon)
+        self.tree_items[path] = item
+        if not probed:
+            self.dir_tree.insert(item, 'end', text='<loading...>', values=[''])
+        return item
+    
+    def _apply_children_hints(self, hints):
+        """根据探测结果为有子文件夹（或无法确定）的节点加上展开箭头"""
+        for path, has_children in hints.items():
+            item = self.tree_items.get(path)
+            if item is None or has_children is False or path in self.tree_loaded or path in self.tree_loading:
+                continue
+            if not self.dir_tree.get_children(item):
+                self.dir_tree.insert(item, 'end', text='<loading...>', values=[''])
     
     def load_subdirectories(self, parent_item, path):
         """加载子目录"""
+        self.tree_loading.add(path)
         threading.Thread(target=self._load_subdirectories_thread, args=(parent_item, path), daemon=True).start()
     
     def _load_subdirectories_thread(self, parent_item, path):
         """加载子目录线程"""
         try:
-            # 获取列表API的路径
-            list_api_path = self.api_info.get('SYNO.FileStation.List', {}).get('path', 'entry.cgi')
-            url = f"{self.nas_url.get()}/webapi/{list_api_path}"
+            # 只请求文件夹，不下载文件条目
+            directories = self.list_subfolders(path)
+            
+            # 更新UI
+            self.ui.post(lambda: self._add_directories_to_tree(parent_item, path, directories))
+            
+            # 探测子文件夹是否还有下级，只给有下级的显示展开箭头
+            child_paths = [f"{path.rstrip('/')}/{dir_info['name']}" for dir_info in directories[:TREE_PROBE_LIMIT]]
+            hints = self.probe_subfolders(child_paths)
+            self.ui.post(lambda: self._apply_children_hints(hints))
+            
+        except Exception as e:
+            print(f"加载子目录失败: {e}")
+            self.ui.post(lambda: self.tree_loading.discard(path))
+    
+    def list_subfolders(self, path, limit=None):
+        """分页列出文件夹下的子文件夹（filetype=dir）；指定limit时只取第一页"""
+        # 获取列表API的路径
+        list_api_path = self.api_info.get('SYNO.FileStation.List', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{list_api_path}"
+        page_size = limit or LISTING_PAGE_SIZE
+        directories = []
+        offset = 0
+        while True:
             params = {
                 'api': 'SYNO.FileStation.List',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.List'),
                 'method': 'list',
-                'folder_path': path
+                'folder_path': path,
+                'filetype': 'dir',
+                'offset': offset,
+                'limit': page_size
             }
-            
-            response = self.session.get(url, params=params, timeout=10)
+            response = self.session.get(url, params=params, timeout=self.timeouts.for_api(page_size))
             response.raise_for_status()
             
             result = response.json()
             if not result.get('success'):
-                return
-                
-            files = result['data']['files']
-            
-            # 只添加文件夹到目录树
-            directories = [f for f in files if f['isdir']]
+                raise Exception(f"获取子目录失败: {result.get('error', {})}")
             
-            # 更新UI
-            self.root.after(0, lambda: self._add_directories_to_tree(parent_item, path, directories))
-            
-        except Exception as e:
-            print(f"加载子目录失败: {e}")
+            files = result['data']['files']
+            offset += len(files)
+            # 旧版本DSM可能忽略filetype，这里再过滤一次
+            directories.extend(f for f in files if f['isdir'])
+            if limit or not files or offset >= result['data'].get('total', 0):
+                return directories
+    
+    def probe_subfolders(self, paths):
+        """并发探测一组文件夹是否有子文件夹，返回 {路径: True/False}，探测失败为None"""
+        def probe(path):
+            try:
+                return bool(self.list_subfolders(path, limit=1))
+            except Exception as e:
+                print(f"⚠ 探测子文件夹失败 {path}: {str(e)}")
+                return None
+        
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=TREE_PROBE_PARALLELISM) as executor:
+            return dict(zip(paths, executor.map(probe, paths)))
     
     def _add_directories_to_tree(self, parent_item, parent_path, directories):
         """添加目录到树形结构"""
-        for dir_info in directories:
-            dir_name = dir_info['name']
-            dir_path = f"{parent_path.rstrip('/')}/{dir_name}"
-            
-            # 添加目录项，使用文件夹图标
-            folder_icon = self.folder_icons.get('folder_closed_tree', '')
-            dir_item = self.dir_tree.insert(parent_item, 'end', text=dir_name, values=[dir_path], image=folder_icon)
-            # 添加占位符，以便显示展开箭头
-            self.dir_tree.insert(dir_item, 'end', text='<loading...>', values=[''])
+        self.tree_loading.discard(parent_path)
+        if self.tree_items.get(parent_path) != parent_item:
+            return  # 加载期间目录树已经重建
+        self.tree_loaded.add(parent_path)
+        # 与已有子节点合并而不是追加，避免和其他加载重复插入
+        self._reconcile_tree_children(parent_item, [(dir_info['name'], f"{parent_path.rstrip('/')}/{dir_info['name']}")
+                                                    for dir_info in directories])
+        
+        # 正在定位的路径经过这个目录时继续向下展开
+        if self.tree_target and self.tree_target.startswith(parent_path.rstrip('/') + '/'):
+            self.update_tree_selection(self.tree_target)
     
     def update_tree_selection(self, path):
-        """更新目录树的选择状态"""
-        # 递归查找并选择对应路径的节点
-        def find_and_select_item(item, target_path):
-            item_values = self.dir_tree.item(item, 'values')
-            if item_values and item_values[0] == target_path:
-                self.dir_tree.selection_set(item)
-                self.dir_tree.see(item)
-                return True
-            
-            # 递归检查子节点
-            for child in self.dir_tree.get_children(item):
-                if find_and_select_item(child, target_path):
-                    return True
-            return False
-        
-        # 从根节点开始查找
-        for root_item in self.dir_tree.get_children():
-            if find_and_select_item(root_item, path):
-                break
+        """更新目录树的选择状态 - 通过路径索引直接定位节点，
+        路径上尚未加载的上级目录按需逐级展开加载"""
+        self.tree_target = path
+        
+        # 找到已经在树中的最近上级
+        found = path
+        while found not in self.tree_items and found != '/':
+            found = found.rsplit('/', 1)[0] or '/'
+        item = self.tree_items.get(found)
+        if item is None:
+            return  # 目录树尚未加载
+        
+        if found != path:
+            self.dir_tree.item(item, open=True)
+            if self.expand_tree_item(item) or found in self.tree_loading:
+                return  # 子目录加载完成后继续定位
+            # 子目录已加载但没有目标（例如刚被删除），停在最近的上级
+        
+        self.tree_target = None
+        if self.dir_tree.selection() != (item,):
+            self.tree_selected_path = found
+            self.dir_tree.selection_set(item)
+        self.dir_tree.see(item)
     
     def on_view_mode_changed(self, event=None):
         """视图模式改变事件"""
@@ -1423,9 +3917,10 @@ class SynologyNASManager:
         print(f"切换到视图模式: {mode}")
         # 重新配置文件列表显示模式
         self.configure_file_list_view(mode)
-        # 重新刷新文件列表以应用新的显示模式
-        if hasattr(self, 'current_path') and self.current_path and self.current_path != "/":
-            self.refresh_file_list()
+        # 用内存中的列表数据按新模式重绘可见行，不重新请求NAS
+        self.file_view.redraw(force=True)
+        if self.file_model.path:
+            self.update_listing_status()
     
     def configure_file_list_view(self, mode):
         """配置文件列表的显示模式"""
@@ -1468,131 +3963,228 @@ class SynologyNASManager:
             
     def load_files(self, path):
         """加载指定路径的文件"""
-        threading.Thread(target=self._load_files_thread, args=(path,), daemon=True).start()
+        model = self.file_model
+        model.generation += 1
+        query = model.query(path)
+        # 刷新当前文件夹时与现有条目比较，只更新变化的部分
+        previous = None
+        if path == model.path and not model.server_side:
+            previous = (model.entries, model.sorted_cache)
+        threading.Thread(target=self._load_files_thread, args=(path, query, model.generation, previous),
+                         daemon=True).start()
+    
+    def fetch_file_page(self, path, offset, query, limit=None):
+        """获取一页文件列表（默认LISTING_PAGE_SIZE项），返回 (文件信息列表, 总数)"""
+        limit = limit or LISTING_PAGE_SIZE
+        # 获取列表API的路径
+        list_api_path = self.api_info.get('SYNO.FileStation.List', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{list_api_path}"
+        # 获取文件列表和附加信息
+        params = {
+            'api': 'SYNO.FileStation.List',
+            'version': self.api_version('SYNO.FileStation.List'),
+            'method': 'list',
+            'folder_path': path,
+            'offset': offset,
+            'limit': limit,
+            'additional': '["size","time"]'  # 尝试JSON数组格式
+            # 不传_sid，使用session的cookie
+        }
+        params.update(query)
+        
+        timeout = self.timeouts.for_api(min(self.listing_sizes.get(path, 0), limit))
+        response = self.session.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        
+        result = response.json()
+        
+        if not result.get('success'):
+            error_info = result.get('error', {})
+            # 如果additional参数有问题，尝试不使用additional参数
+            if error_info.get('code') == 400:  # 可能是参数错误
+                del params['additional']
+                response = self.session.get(url, params=params, timeout=timeout)
+                result = response.json()
+                
+            if not result.get('success'):
+                raise Exception(f"获取文件列表失败: {result.get('error', {})}")
         
-    def _load_files_thread(self, path):
+        data = result['data']
+        return data['files'], data.get('total', offset + len(data['files']))
+        
+    def _load_files_thread(self, path, query, generation, previous=None):
         """加载文件线程"""
         try:
             self.update_status("正在加载文件...")
             
-            # 获取列表API的路径
-            list_api_path = self.api_info.get('SYNO.FileStation.List', {}).get('path', 'entry.cgi')
-            url = f"{self.nas_url.get()}/webapi/{list_api_path}"
-            # 获取文件列表和附加信息
-            params = {
-                'api': 'SYNO.FileStation.List',
-                'version': '2',
-                'method': 'list',
-                'folder_path': path,
-                'additional': '["size","time"]'  # 尝试JSON数组格式
-                # 不传_sid，使用session的cookie
-            }
-            
-                                    
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            if not result.get('success'):
-                error_info = result.get('error', {})
-                # 如果additional参数有问题，尝试不使用additional参数
-                if error_info.get('code') == 400:  # 可能是参数错误
-                    params_simple = {
-                        'api': 'SYNO.FileStation.List',
-                        'version': '2',
-                        'method': 'list',
-                        'folder_path': path
-                    }
-                    response = self.session.get(url, params=params_simple, timeout=10)
-                    result = response.json()
-                    
-                if not result.get('success'):
-                    raise Exception(f"获取文件列表失败: {result.get('error', {})}")
-                    
-            files = result['data']['files']
+            # 不超过阈值的文件夹一次请求全部列出；已知过大或由NAS筛选时只请求一页
+            filtered = 'pattern' in query or 'filetype' in query
+            if filtered or self.listing_sizes.get(path, 0) > SERVER_LISTING_THRESHOLD:
+                limit = LISTING_PAGE_SIZE
+            else:
+                limit = SERVER_LISTING_THRESHOLD
+            files, total = self.fetch_file_page(path, 0, query, limit)
+            # 文件夹过大（或已经在用NAS筛选）时只保留已取到的部分，其余按需加载
+            server_side = total > SERVER_LISTING_THRESHOLD or filtered
+            if not server_side:
+                # 列出期间文件夹变大，或NAS限制了单次返回数量时补齐剩余部分
+                while len(files) < total:
+                    page, total = self.fetch_file_page(path, len(files), query, SERVER_LISTING_THRESHOLD)
+                    if not page:
+                        break
+                    files.extend(page)
+            self.listing_sizes[path] = total
+            
+            # 在后台线程中准备好显示内容
+            if previous and not server_side:
+                merged = FileListModel.merge_listing(previous[0], previous[1], files, self.format_file_size)
+                if merged is None:
+                    self.ui.post(lambda: self._on_listing_unchanged(generation))
+                    return
+                entries, orders = merged
+            else:
+                entries = FileEntry.from_listing(files, self.format_file_size)
+                orders = None if server_side else FileListModel.build_orders(entries)
             
             # 更新UI
-            self.root.after(0, lambda: self._update_file_list(files))
+            self.ui.post(lambda: self._update_file_list(path, entries, orders, server_side, total,
+                                                              generation))
             
         except Exception as e:
-            self.root.after(0, lambda: self.update_status(f"加载文件失败: {str(e)}"))
-            
-    def _update_file_list(self, files):
-        """更新文件列表"""
-        # 清空现有项目
-        self.file_list.delete(*self.file_list.get_children())
-        
-        # 根据视图模式调整显示
+            self.update_status(f"加载文件失败: {str(e)}")
+            
+    def _update_file_list(self, path, entries, orders, server_side, total, generation):
+        """更新文件列表 - 条目和排序已在加载线程中准备好，这里只交给虚拟列表绘制"""
+        if generation != self.file_model.generation:
+            return  # 已经发起了更新的加载
+        same_folder = path == self.file_model.path
+        self.file_model.set_entries(path, entries, orders, server_side, total)
+        if not same_folder:
+            # 进入其他文件夹时清空筛选
+            self.file_filter.set("")
+            self.file_filter_type.set("全部")
+            self.file_model.filter_text = ""
+            self.file_model.filter_type = 'all'
+        self.file_view.set_rows(self.file_model.rows(), keep_position=same_folder and not server_side)
+        self.update_listing_status()
+    
+    def _on_listing_unchanged(self, generation):
+        """刷新结果与当前列表相同，不需要改动界面"""
+        if generation == self.file_model.generation:
+            self.update_listing_status()
+    
+    def update_listing_status(self):
+        """在状态栏显示已加载/筛选出的项目数"""
+        model = self.file_model
+        if model.server_side:
+            self.update_status(f"已加载 {len(model.entries)} / {model.total} 个项目（由NAS排序和筛选）")
+        elif model.filter_text.strip() or model.filter_type != 'all':
+            self.update_status(f"筛选出 {len(self.file_view.rows)} / {len(model.entries)} 个项目")
+        else:
+            self.update_status(f"已加载 {len(model.entries)} 个项目 - {self.view_mode.get()}")
+    
+    def load_more_files(self):
+        """服务器端模式下滚动到末尾时加载下一页"""
+        model = self.file_model
+        if not model.has_more() or model.loading:
+            return
+        model.loading = True
+        threading.Thread(target=self._load_more_files_thread,
+                         args=(model.path, len(model.entries), model.query(model.path), model.generation),
+                         daemon=True).start()
+    
+    def _load_more_files_thread(self, path, offset, query, generation):
+        """加载下一页文件线程"""
+        try:
+            files, total = self.fetch_file_page(path, offset, query)
+            entries = FileEntry.from_listing(files, self.format_file_size)
+            self.ui.post(lambda: self._append_file_page(entries, total, generation))
+        except Exception as e:
+            print(f"⚠ 加载下一页失败: {str(e)}")
+            self.ui.post(lambda: self._append_file_page([], None, generation))
+    
+    def _append_file_page(self, entries, total, generation):
+        """把新加载的一页追加到列表末尾"""
+        model = self.file_model
+        if generation != model.generation:
+            return
+        model.loading = False
+        if total is None:
+            self.update_status("加载下一页失败")
+            return
+        model.entries.extend(entries)
+        model.total = total if entries else len(model.entries)
+        self.file_view.set_rows(model.rows(), keep_position=True)
+        self.update_listing_status()
+    
+    def sort_file_list(self, column):
+        """点击列标题排序（文件夹不大时只在内存中排序，不重新请求NAS）"""
+        self.file_model.sort_by(column)
+        self.update_sort_headings()
+        if self.file_model.server_side:
+            self.load_files(self.current_path)
+        else:
+            self.file_view.set_rows(self.file_model.rows(), keep_position=True)
+    
+    def update_sort_headings(self):
+        """在当前排序列的标题上显示排序方向"""
+        titles = {'name': '文件名', 'type': '类型', 'size': '大小', 'modified': '修改时间'}
+        for column, title in titles.items():
+            if column == self.file_model.sort_column:
+                title += ' ▼' if self.file_model.sort_reverse else ' ▲'
+            self.file_list.heading(column, text=title)
+    
+    def on_filter_changed(self, *args):
+        """筛选框内容变化 - 停止输入一小段时间后再筛选"""
+        if self.filter_after_id:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(150, self.apply_file_filter)
+    
+    def apply_file_filter(self):
+        """按筛选框内容和类型筛选当前文件夹"""
+        if self.filter_after_id:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = None
+        model = self.file_model
+        text = self.file_filter.get()
+        file_type = FileListModel.FILE_TYPES.get(self.file_filter_type.get(), 'all')
+        if text == model.filter_text and file_type == model.filter_type:
+            return
+        model.filter_text = text
+        model.filter_type = file_type
+        if model.server_side:
+            # 大文件夹由NAS按pattern/filetype筛选
+            self.load_files(self.current_path)
+            return
+        self.file_view.set_rows(model.rows(), keep_position=True)
+        self.update_listing_status()
+    
+    def render_file_row(self, entry):
+        """生成一行在Treeview中的显示内容（只对可见行调用）"""
         view_mode = self.view_mode.get()
         
-        for i, file_info in enumerate(files):
-            name = file_info['name']
-            is_dir = file_info['isdir']
-            file_type = self.get_file_type_display(name, is_dir)
-            
-            # 处理大小
-            size = ""
-            if not is_dir and 'additional' in file_info and 'size' in file_info['additional']:
-                size_bytes = int(file_info['additional']['size'])
-                size = self.format_file_size(size_bytes)
-                
-            # 处理修改时间
-            modified = ""
-            if 'additional' in file_info and 'time' in file_info['additional']:
-                mtime = file_info['additional']['time']['mtime']
-                modified = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 选择合适的图标
-            icon = ""
-            if is_dir and hasattr(self, 'folder_icons'):
-                if view_mode == "列表视图":
-                    icon = self.folder_icons.get('folder_closed_list', '')
-                elif view_mode == "平铺视图":
-                    icon = self.folder_icons.get('folder_closed_tile', '')
-                elif view_mode == "小图标":
-                    icon = self.folder_icons.get('folder_closed_small', '')
-                elif view_mode == "中图标":
-                    icon = self.folder_icons.get('folder_closed_medium', '')
-                elif view_mode == "大图标":
-                    icon = self.folder_icons.get('folder_closed_large', '')
-                else:
-                    icon = self.folder_icons.get('folder_closed_list', '')
-            elif not is_dir and self.is_image_file(name) and view_mode in ["中图标", "大图标"]:
-                # 为图片文件生成缩略图
-                icon = self.get_image_thumbnail(name, view_mode)
-                
-            # 插入文件项目，根据视图模式决定是否显示图标
-            if view_mode == "列表视图":
-                # 标准列表视图
-                item_id = self.file_list.insert('', 'end', values=(name, file_type, size, modified), image=icon)
-            elif view_mode == "平铺视图":
-                # 平铺视图 - 显示图标和名称，其他信息在列中显示
-                item_id = self.file_list.insert('', 'end', text=name, values=(name, file_type, size, modified), image=icon)
-            else:  # 图标视图
-                # 图标视图 - 主要显示名称和图标，确保文件名正确显示
-                item_id = self.file_list.insert('', 'end', text=name, values=(name, file_type, size, modified), image=icon)
-                # 设置项目的标签，确保文件名显示在图标下方
-                self.file_list.set(item_id, '#0', name)
-            
-        self.update_status(f"已加载 {len(files)} 个项目 - {view_mode}")
+        # 选择合适的图标
+        icon = ""
+        if entry.is_dir and hasattr(self, 'folder_icons'):
+            icon = self.folder_icons.get(FOLDER_ICON_KEYS.get(view_mode, 'folder_closed_list'), '')
+        elif entry.is_image and view_mode in ["中图标", "大图标"]:
+            # 为图片文件生成缩略图
+            icon = self.get_image_thumbnail(entry.name, view_mode)
+        
+        # 图标视图中文件名显示在树形列
+        return {'text': entry.name, 'values': entry.values, 'image': icon}
         
     def on_file_double_click(self, event):
         """文件双击事件"""
-        selection = self.file_list.selection()
+        selection = self.file_view.selected_rows()
         if not selection:
             return
             
-        item = selection[0]
-        values = self.file_list.item(item, 'values')
-        if not values:
-            return
-            
-        filename = values[0]
-        file_type = values[1]
+        entry = selection[0]
+        filename = entry.name
         
         # 如果是文件夹，则进入该文件夹
-        if file_type == "[文件夹]" or "文件夹" in file_type:
+        if entry.is_dir:
             new_path = f"{self.current_path.rstrip('/')}/{filename}"
             self.current_path = new_path
             self.path_label.configure(text=self.current_path)
@@ -1600,86 +4192,88 @@ class SynologyNASManager:
             # 同时更新左侧目录树的选择
             self.update_tree_selection(self.current_path)
         # 如果是图片文件，则预览
-        elif self.is_image_file(filename):
+        elif entry.is_image:
             self.preview_image(filename)
         # 如果是视频文件，则预览
-        elif self.is_video_file(filename):
+        elif entry.is_video:
             self.preview_video(filename)
             
     def refresh_file_list(self):
         """刷新文件列表"""
         self.load_files(self.current_path)
+    
+    def refresh_all(self):
+        """刷新按钮 - 刷新文件列表，并就地刷新目录树（保留已展开的目录）"""
+        self.refresh_file_list()
+        self.load_shared_folders()
         
     def on_file_right_click(self, event):
         """文件右键点击事件"""
         # 选择右键点击的项目
-        item = self.file_list.identify('item', event.x, event.y)
-        if item:
-            self.file_list.selection_set(item)
-            # 检查是否是文件（不是文件夹）
-            values = self.file_list.item(item, 'values')
-            if values and values[1] != "[文件夹]" and "文件夹" not in values[1]:  # 只有文件才能操作
-                # 动态更新右键菜单
-                self.update_context_menu(values[0])
-                self.context_menu.post(event.x_root, event.y_root)
-    
-    def update_context_menu(self, filename):
+        index = self.file_view.index_at(event.y)
+        if index is not None:
+            entry = self.file_view.rows[index]
+            # 右键点击已选中的项目时保留多选
+            if entry.name not in self.file_view.selected:
+                self.file_view.select_index(index)
+            # 动态更新右键菜单
+            self.update_context_menu(entry.name, entry.is_dir, len(self.file_view.selected) > 1)
+            self.context_menu.post(event.x_root, event.y_root)
+
+    def update_context_menu(self, filename, is_dir=False, multiple=False):
         """更新右键菜单选项"""
         # 清空现有菜单项
         self.context_menu.delete(0, tk.END)
-        
+
         # 根据文件类型添加菜单项
-        if self.is_image_file(filename):
-            self.context_menu.add_command(label="预览图片", command=self.preview_selected_file)
-        elif self.is_video_file(filename):
-            self.context_menu.add_command(label="预览视频", command=self.preview_selected_file)
-        
-        self.context_menu.add_command(label="下载", command=self.download_selected_file)
+        if not is_dir and not multiple:
+            if self.is_image_file(filename):
+                self.context_menu.add_command(label="预览图片", command=self.preview_selected_file)
+            elif self.is_video_file(filename):
+                self.context_menu.add_command(label="预览视频", command=self.preview_selected_file)
+
+            self.context_menu.add_command(label="下载", command=self.download_selected_file)
+
+        self.context_menu.add_command(label="打包下载", command=self.download_selected_as_archive)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="刷新", command=self.refresh_file_list)
         self.context_menu.add_command(label="清理缩略图缓存", command=self.clear_thumbnail_cache)
                 
     def preview_selected_file(self):
         """预览按钮点击事件"""
-        selection = self.file_list.selection()
+        selection = self.file_view.selected_rows()
         if not selection:
             messagebox.showwarning("提示", "请先选择要预览的文件")
             return
             
-        item = selection[0]
-        values = self.file_list.item(item, 'values')
-        if not values:
-            return
-            
-        filename = values[0]
-        file_type = values[1]
+        entry = selection[0]
+        filename = entry.name
         
         # 检查是否为文件夹
-        if file_type == "[文件夹]" or "文件夹" in file_type:
+        if entry.is_dir:
             messagebox.showwarning("提示", "只能预览文件，不能预览文件夹")
             return
         
         # 检查文件类型并预览
-        if self.is_image_file(filename):
+        if entry.is_image:
             self.preview_image(filename)
-        elif self.is_video_file(filename):
+        elif entry.is_video:
             self.preview_video(filename)
         else:
             messagebox.showwarning("提示", "只能预览图片和视频文件")
     
     def download_file(self):
         """下载按钮点击事件"""
-        selection = self.file_list.selection()
+        selection = self.file_view.selected_rows()
         if not selection:
             messagebox.showwarning("提示", "请先选择要下载的文件")
             return
-            
-        item = selection[0]
-        values = self.file_list.item(item, 'values')
-        if not values or values[1] == "[文件夹]" or "文件夹" in values[1]:
-            messagebox.showwarning("提示", "只能下载文件，不能下载文件夹")
+
+        # 多选或包含文件夹时，由NAS打包成一个ZIP下载
+        if len(selection) > 1 or selection[0].is_dir:
+            self.download_selected_as_archive()
             return
-            
+
         self.download_selected_file()
         
     def download_selected_file(self):
@@ -1688,23 +4282,16 @@ class SynologyNASManager:
             messagebox.showerror("错误", "请先登录")
             return
             
-        # 验证会话是否有效
-        if not self.verify_session():
-            messagebox.showerror("错误", "会话已过期，请重新登录")
-            self.logout()
-            return
-            
-        selection = self.file_list.selection()
+        selection = self.file_view.selected_rows()
         if not selection:
             return
             
-        item = selection[0]
-        values = self.file_list.item(item, 'values')
-        if not values or values[1] == "[文件夹]" or "文件夹" in values[1]:
+        entry = selection[0]
+        if entry.is_dir:
             messagebox.showwarning("提示", "只能下载文件")
             return
             
-        filename = values[0]
+        filename = entry.name
         # 构建正确的文件路径
         if self.current_path == "/":
             file_path = f"/{filename}"
@@ -1723,199 +4310,1060 @@ class SynologyNASManager:
             
         # 在新线程中下载
         threading.Thread(target=self._download_file_thread, args=(file_path, save_path, filename), daemon=True).start()
-        
+
+    def download_selected_as_archive(self):
+        """将选中的文件和文件夹打包下载，并边下载边解压"""
+        if not self.session_id:
+            messagebox.showerror("错误", "请先登录")
+            return
+
+        selection = self.file_view.selected_rows()
+        if not selection:
+            messagebox.showwarning("提示", "请先选择要下载的文件")
+            return
+
+        paths = [f"{self.current_path.rstrip('/')}/{entry.name}" for entry in selection]
+
+        # 选择解压位置
+        target_dir = filedialog.askdirectory(title="选择保存位置")
+        if not target_dir:
+            return
+
+        threading.Thread(target=self._download_archive_thread, args=(paths, target_dir), daemon=True).start()
+
     def upload_file(self):
-        """上传文件"""
+        """上传文件（支持多选）"""
         if not self.session_id:
             messagebox.showerror("错误", "请先登录")
             return
             
-        # 验证会话是否有效
-        if not self.verify_session():
-            messagebox.showerror("错误", "会话已过期，请重新登录")
-            self.logout()
+        # 确保路径正确，如果是根目录，显示错误
+        if self.current_path == "/":
+            messagebox.showerror("错误", "请先选择一个共享文件夹，不能直接上传到根目录")
             return
             
-        # 选择文件
-        file_path = filedialog.askopenfilename(
+        # 选择文件，可一次选择多个
+        file_paths = filedialog.askopenfilenames(
             title="选择要上传的文件",
             filetypes=[("所有文件", "*.*")]
         )
         
-        if not file_path:
+        if not file_paths:
             return
             
-        # 在新线程中上传
-        threading.Thread(target=self._upload_file_thread, args=(file_path,), daemon=True).start()
-        
-    def _upload_file_thread(self, file_path):
-        """上传文件线程"""
+        # 在新线程中上传，会话在批次开始时统一验证
+        parallelism = self.get_upload_parallelism()
+        threading.Thread(target=self._upload_batch_thread,
+                         args=(list(file_paths), self.current_path, parallelism), daemon=True).start()
+
+    def get_upload_parallelism(self):
+        """读取上传并发数设置"""
         try:
-            filename = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
+            return min(max(int(self.upload_parallelism.get()), 1), MAX_UPLOAD_PARALLELISM)
+        except (ValueError, tk.TclError):
+            return DEFAULT_UPLOAD_PARALLELISM
+
+    def _upload_batch_thread(self, file_paths, dest_path, parallelism):
+        """批量上传线程 - 会话只验证一次，按并发数并行上传，全部结束后只刷新一次列表"""
+        cancel_event = self.begin_transfer()
+        try:
+            self.ui.post(lambda: self.show_progress(True))
+            self.update_status(f"正在上传 {len(file_paths)} 个文件...")
             
-            self.root.after(0, lambda: self.show_progress(True))
-            self.update_status(f"正在上传 {filename}...")
+            jobs = [(file_path, dest_path) for file_path in file_paths]
+            batch = self._run_upload_batch(jobs, dest_path, parallelism, cancel_event)
+            self.ui.post(lambda: self._on_upload_batch_done(batch))
+            
+        except Exception as e:
+            error_msg = str(e)
+            self.ui.post(lambda: self._on_upload_error(error_msg))
+        finally:
+            self.end_transfer(cancel_event)
+
+    def _run_upload_batch(self, jobs, dest_path, parallelism, cancel_event, journal_ids=None):
+        """用线程池上传jobs中的(本地文件, 远程目录)，返回UploadBatch；journal_ids为续传时已有的日志id"""
+        batch = UploadBatch(jobs, dest_path)
+        if journal_ids is None:
+            journal_ids = self.journal_add('upload', jobs)
+        batch.journal_ids = dict(zip(batch.file_paths, journal_ids))
+        try:
+            with ThreadPoolExecutor(max_workers=parallelism) as executor:
+                futures = [executor.submit(self._upload_with_retry, file_path, remote_dir, batch, cancel_event)
+                           for file_path, remote_dir in jobs]
+                for future in futures:
+                    future.result()
+        finally:
+            self.transfer_journal.flush()
+        return batch
+
+    def upload_folder(self):
+        """上传整个文件夹（包括子文件夹）"""
+        if not self.session_id:
+            messagebox.showerror("错误", "请先登录")
+            return
             
-            # 确保路径正确，如果是根目录，显示错误
-            if self.current_path == "/":
-                raise Exception("请先选择一个共享文件夹，不能直接上传到根目录")
+        if self.current_path == "/":
+            messagebox.showerror("错误", "请先选择一个共享文件夹，不能直接上传到根目录")
+            return
             
-            # 上传前再次验证会话并刷新SID
-            if not self.refresh_session_if_needed():
-                raise Exception("会话验证失败，请重新登录")
+        local_dir = filedialog.askdirectory(title="选择要上传的文件夹")
+        if not local_dir:
+            return
             
-            # 准备上传参数
-            # 获取上传API的路径
-            upload_api_path = self.api_info.get('SYNO.FileStation.Upload', {}).get('path', 'entry.cgi')
-            url = f"{self.nas_url.get()}/webapi/{upload_api_path}"
-                
-            # 使用API信息中的最大版本号
-            api_version = self.api_info.get('SYNO.FileStation.Upload', {}).get('maxVersion', 2)
+        parallelism = self.get_upload_parallelism()
+        threading.Thread(target=self._upload_folder_thread,
+                         args=(local_dir, self.current_path, parallelism), daemon=True).start()
+
+    def _upload_folder_thread(self, local_dir, dest_path, parallelism):
+        """文件夹上传线程 - 扫描本地目录，批量创建远程文件夹后并行上传文件"""
+        cancel_event = self.begin_transfer()
+        try:
+            self.ui.post(lambda: self.show_progress(True))
+            self.update_status(f"正在扫描 {local_dir}...")
+            
+            remote_root = f"{dest_path.rstrip('/')}/{os.path.basename(os.path.normpath(local_dir))}"
+            folders, jobs = self.scan_local_folder(local_dir, remote_root)
+            
+            self.update_status(f"正在创建 {len(folders)} 个文件夹...")
+            self.create_remote_folders(folders)
+            
+            batch = self._run_upload_batch(self.interleave_by_size(jobs), remote_root, parallelism, cancel_event)
+            self.ui.post(lambda: self._on_upload_batch_done(batch))
             
+        except Exception as e:
+            error_msg = str(e)
+            self.ui.post(lambda: self._on_upload_error(error_msg))
+        finally:
+            self.end_transfer(cancel_event)
+
+    def scan_local_folder(self, local_dir, remote_root):
+        """扫描本地目录，返回需要创建的远程叶子文件夹列表和(本地文件, 远程目录)列表"""
+        folders = []
+        jobs = []
+        for dirpath, dirnames, filenames in os.walk(local_dir):
+            rel = os.path.relpath(dirpath, local_dir)
+            remote_dir = remote_root if rel == '.' else f"{remote_root}/{rel.replace(os.sep, '/')}"
+            # 只需创建叶子文件夹，上级文件夹由force_parent自动创建
+            if not dirnames:
+                folders.append(remote_dir)
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                if os.path.isfile(file_path):
+                    jobs.append((file_path, remote_dir))
+        return folders, jobs
+
+    def create_remote_folders(self, folders):
+        """用尽量少的CreateFolder请求批量创建远程文件夹（已存在的文件夹不会报错）"""
+        api_path = self.api_info.get('SYNO.FileStation.CreateFolder', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{api_path}"
+        
+        for start in range(0, len(folders), CREATE_FOLDER_BATCH):
+            chunk = folders[start:start + CREATE_FOLDER_BATCH]
+            parents = [folder.rsplit('/', 1)[0] for folder in chunk]
+            names = [folder.rsplit('/', 1)[1] for folder in chunk]
             data = {
-                'api': 'SYNO.FileStation.Upload',
-                'version': str(api_version),
-                'method': 'upload',
-                'path': self.current_path,
-                'create_parents': 'false',
-                'overwrite': 'true'
-                # 不传_sid，使用session的cookie
+                'api': 'SYNO.FileStation.CreateFolder',
+                'version': self.api_version('SYNO.FileStation.CreateFolder'),
+                'method': 'create',
+                'folder_path': json.dumps(parents, ensure_ascii=False),
+                'name': json.dumps(names, ensure_ascii=False),
+                'force_parent': 'true'
             }
+            # 路径数组可能很长，使用POST避免URL超长；force_parent下重复创建不会出错，可以安全重试
+            response = self.session.post(url, data=data, timeout=self.timeouts.for_api(len(chunk)), idempotent=True)
+            result = response.json()
+            if not result.get('success'):
+                error_code = result.get('error', {}).get('code', 'unknown')
+                raise NASAPIError(f"创建文件夹失败，错误代码: {error_code}", error_code)
+
+    def sync_folder(self):
+        """单向同步：只把新增或修改过的本地文件上传到当前目录"""
+        if not self.session_id:
+            messagebox.showerror("错误", "请先登录")
+            return
             
-            # 打开文件准备上传
-            with open(file_path, 'rb') as f:
-                files_data = {'file': (filename, f, 'application/octet-stream')}
-                
-                response = self.session.post(url, data=data, files=files_data, timeout=300)
-                response.raise_for_status()
-                
+        if self.current_path == "/":
+            messagebox.showerror("错误", "请先选择一个共享文件夹，不能直接同步到根目录")
+            return
+            
+        local_dir = filedialog.askdirectory(title="选择要同步的本地文件夹")
+        if not local_dir:
+            return
+            
+        threading.Thread(target=self._sync_plan_thread, args=(local_dir, self.current_path), daemon=True).start()
+
+    def _sync_plan_thread(self, local_dir, dest_path):
+        """生成同步计划线程 - 扫描本地目录并递归列出远程文件后比较"""
+        try:
+            self.ui.post(lambda: self.show_progress(True))
+            self.update_status(f"正在比较 {local_dir} 与NAS上的文件...")
+            
+            remote_root = f"{dest_path.rstrip('/')}/{os.path.basename(os.path.normpath(local_dir))}"
+            folders, jobs = self.scan_local_folder(local_dir, remote_root)
+            remote_files, remote_dirs = self.list_remote_tree(remote_root, self.get_upload_parallelism())
+            
+            plan = SyncPlan(local_dir, remote_root)
+            plan.compare(folders, jobs, remote_files, remote_dirs)
+            self.ui.post(lambda: self._on_sync_plan_ready(plan))
+            
+        except Exception as e:
+            error_msg = str(e)
+            self.ui.post(lambda: self._on_upload_error(error_msg))
+
+    def _on_sync_plan_ready(self, plan):
+        """显示同步计划，由用户确认后再上传"""
+        self.hide_progress_if_idle()
+        self.update_status(f"同步计划: 上传 {len(plan.uploads)} 个文件，跳过 {plan.skipped} 个")
+        SyncPlanDialog(self.root, plan, self.format_file_size, self.start_sync)
+
+    def start_sync(self, plan):
+        """按计划开始同步"""
+        parallelism = self.get_upload_parallelism()
+        threading.Thread(target=self._sync_upload_thread, args=(plan, parallelism), daemon=True).start()
+
+    def _sync_upload_thread(self, plan, parallelism):
+        """同步上传线程"""
+        cancel_event = self.begin_transfer()
+        try:
+            self.ui.post(lambda: self.show_progress(True))
+            self.update_status(f"正在同步 {len(plan.uploads)} 个文件...")
+            
+            self.create_remote_folders(plan.folders)
+            batch = self._run_upload_batch(plan.jobs, plan.remote_root, parallelism, cancel_event)
+            self.ui.post(lambda: self._on_sync_done(plan, batch))
+            
+        except Exception as e:
+            error_msg = str(e)
+            self.ui.post(lambda: self._on_upload_error(error_msg))
+        finally:
+            self.end_transfer(cancel_event)
+
+    def _on_sync_done(self, plan, batch):
+        """同步结束回调 - 显示发送与跳过的字节数"""
+        self.hide_progress_if_idle()
+        
+        failed = batch.results['failed']
+        summary = (f"上传 {len(batch.results['ok'])} 个文件 ({self.format_file_size(batch.stats.transferred)})，"
+                   f"跳过 {plan.skipped} 个未修改的文件 ({self.format_file_size(plan.bytes_skipped)})")
+        if batch.results['cancelled']:
+            summary += f"，取消 {len(batch.results['cancelled'])} 个"
+        self.update_status(f"同步完成: {summary}")
+        if failed:
+            details = '\n'.join(f"{os.path.basename(path)}: {error}" for path, error in failed[:10])
+            messagebox.showerror("同步失败", f"{summary}，失败 {len(failed)} 个\n\n{details}")
+        else:
+            messagebox.showinfo("同步完成", summary)
+        
+        if batch.results['ok'] or plan.folders:
+            self.refresh_file_list()
+
+    def list_remote_tree(self, remote_root, parallelism):
+        """递归列出远程目录，返回({文件路径: (大小, 修改时间)}, 文件夹路径集合)，同一层的文件夹并行列出"""
+        files = {}
+        dirs = set()
+        level = [remote_root]
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            while level:
+                next_level = []
+                for folder, entries in zip(level, executor.map(self.list_remote_folder, level)):
+                    if entries is None:
+                        continue
+                    dirs.add(folder)
+                    for entry in entries:
+                        if entry.get('isdir'):
+                            next_level.append(entry['path'])
+                        else:
+                            additional = entry.get('additional', {})
+                            files[entry['path']] = (int(additional.get('size', -1)),
+                                                    additional.get('time', {}).get('mtime', 0))
+                level = next_level
+        return files, dirs
+
+    def list_remote_folder(self, folder_path, page_size=1000):
+        """分页列出一个远程文件夹的全部条目（含大小和修改时间），文件夹不存在时返回None"""
+        list_api_path = self.api_info.get('SYNO.FileStation.List', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{list_api_path}"
+        entries = []
+        while True:
+            params = {
+                'api': 'SYNO.FileStation.List',
+                'version': self.api_version('SYNO.FileStation.List'),
+                'method': 'list',
+                'folder_path': folder_path,
+                'additional': '["size","time"]',
+                'offset': len(entries),
+                'limit': page_size
+            }
+            response = self.session.get(url, params=params, timeout=self.timeouts.for_api(page_size))
+            response.raise_for_status()
             result = response.json()
             if not result.get('success'):
-                error_info = result.get('error', {})
-                error_code = error_info.get('code', 'unknown')
-                error_messages = {
-                    119: "会话未找到，请重新登录",
-                    407: "操作不被允许，请检查文件夹权限",
-                    1800: "上传数据不完整",
-                    1801: "上传超时",
-                    1802: "文件名信息缺失",
-                    1803: "上传被取消",
-                    1804: "文件过大",
-                    1805: "文件已存在且无法覆盖"
-                }
-                error_msg = error_messages.get(error_code, f"上传失败，错误代码: {error_code}")
-                if error_code == 119:
-                    # SID过期，尝试自动重新登录
-                    self.session_id = None
-                    if self.last_login_info:
-                        self.root.after(0, self.try_auto_login)  # 立即尝试重新登录
-                        error_msg = "会话已过期，正在尝试自动重新登录...\n请稍后再试上传操作"
+                error_code = result.get('error', {}).get('code', 'unknown')
+                if error_code == 408:  # 文件夹不存在
+                    return None
+                raise NASAPIError(f"获取文件列表失败，错误代码: {error_code}", error_code)
+            data = result['data']
+            entries.extend(data['files'])
+            if not data['files'] or len(entries) >= data.get('total', 0):
+                return entries
+
+    def toggle_watch_folder(self):
+        """开始或停止监视本地文件夹"""
+        if self.folder_watcher:
+            self.stop_watch_folder()
+            self.update_status("已停止监视文件夹")
+            return
+            
+        if not self.session_id:
+            messagebox.showerror("错误", "请先登录")
+            return
+            
+        if self.current_path == "/":
+            messagebox.showerror("错误", "请先选择一个共享文件夹，不能直接同步到根目录")
+            return
+            
+        local_dir = filedialog.askdirectory(title="选择要监视的本地文件夹")
+        if not local_dir:
+            return
+            
+        remote_root = f"{self.current_path.rstrip('/')}/{os.path.basename(os.path.normpath(local_dir))}"
+        watcher = FolderWatcher(
+            local_dir,
+            lambda paths, exact: self._upload_watched_files(local_dir, remote_root, paths, exact))
+        try:
+            watcher.start()
+        except Exception as e:
+            messagebox.showerror("错误", f"无法监视文件夹: {str(e)}")
+            return
+            
+        self.folder_watcher = watcher
+        self.watch_btn.configure(text="停止监视")
+        self.update_status(f"正在监视 {local_dir} → {remote_root}")
+
+    def stop_watch_folder(self):
+        """停止文件夹监视"""
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+        self.watch_btn.configure(text="监视文件夹")
+
+    def _upload_watched_files(self, local_dir, remote_root, paths, exact):
+        """上传监视到的一批文件（在监视线程中执行，沿用已登录的会话），返回需要稍后重试的文件"""
+        if not self.session_id:
+            return paths  # 未登录，登录后再上传
+            
+        jobs = []
+        for path in paths:
+            rel = os.path.relpath(os.path.dirname(path), local_dir)
+            remote_dir = remote_root if rel == '.' else f"{remote_root}/{rel.replace(os.sep, '/')}"
+            jobs.append((path, remote_dir))
+        folders = sorted({remote_dir for _, remote_dir in jobs})
+        
+        if not exact:
+            # 轮询（或事件丢失后的重新扫描）只知道哪些目录变了，逐目录与NAS比较后只上传真正改变的文件
+            remote_files = {}
+            remote_dirs = set()
+            for folder in folders:
+                entries = self.list_remote_folder(folder)
+                if entries is None:
+                    continue
+                remote_dirs.add(folder)
+                for entry in entries:
+                    additional = entry.get('additional', {})
+                    remote_files[entry['path']] = (int(additional.get('size', -1)),
+                                                   additional.get('time', {}).get('mtime', 0))
+            plan = SyncPlan(local_dir, remote_root)
+            plan.compare(folders, jobs, remote_files, remote_dirs)
+            jobs = plan.jobs
+            folders = plan.folders
+        
+        if not jobs:
+            return []
+        return self._run_watch_batch(jobs, folders, remote_root)
+
+    def _run_watch_batch(self, jobs, folders, remote_root):
+        """创建所需文件夹并并行上传一批监视到的文件，返回失败的文件"""
+        cancel_event = self.begin_transfer()
+        try:
+            self.create_remote_folders(folders)
+            batch = self._run_upload_batch(jobs, remote_root, self.get_upload_parallelism(), cancel_event)
+        finally:
+            self.end_transfer(cancel_event)
+            
+        failed = batch.results['failed']
+        message = f"监视: 已上传 {len(batch.results['ok'])} 个文件"
+        if failed:
+            message += f"，失败 {len(failed)} 个（稍后重试）"
+        self.ui.post(lambda: self._on_watch_batch_done(message, remote_root))
+        return [file_path for file_path, error in failed]
+
+    def _on_watch_batch_done(self, message, remote_root):
+        """监视上传一批结束回调"""
+        self.hide_progress_if_idle()
+        self.update_status(message)
+        # 正在浏览的目录在同步范围内时刷新列表
+        if self.current_path == remote_root or self.current_path.startswith(remote_root + '/'):
+            self.refresh_file_list()
+
+    def journal_add(self, direction, items):
+        """在传输日志中登记任务，返回id列表"""
+        ids = self.transfer_journal.add_many(self.nas_url.get(), direction, items)
+        with self.transfer_lock:
+            self.journal_active.update(entry_id for entry_id in ids if entry_id is not None)
+        return ids
+
+    def journal_finish(self, entry_id, result):
+        """任务结束后从日志中移除；关闭程序导致的取消保留在日志中，下次登录续传"""
+        if entry_id is None:
+            return
+        with self.transfer_lock:
+            self.journal_active.discard(entry_id)
+        if result == 'cancelled' and self.shutting_down:
+            return
+        self.transfer_journal.remove(entry_id)
+
+    def resume_pending_transfers(self):
+        """登录后继续上次未完成的传输"""
+        with self.transfer_lock:
+            active = set(self.journal_active)
+        rows = [row for row in self.transfer_journal.pending(self.nas_url.get()) if row[0] not in active]
+        if not rows:
+            return
+            
+        uploads = []
+        downloads = []
+        for entry_id, direction, local_path, remote_path, size in rows:
+            if direction == 'upload' and not os.path.isfile(local_path):
+                # 本地文件已不存在，无法续传
+                self.transfer_journal.remove(entry_id)
+                continue
+            with self.transfer_lock:
+                self.journal_active.add(entry_id)
+            if direction == 'upload':
+                uploads.append((entry_id, local_path, remote_path))
+            else:
+                downloads.append((entry_id, local_path, remote_path, size))
+        self.transfer_journal.flush()
+        
+        if uploads or downloads:
+            print(f"✓ 继续未完成的传输: 上传 {len(uploads)} 个，下载 {len(downloads)} 个")
+            self.update_status(f"正在继续未完成的传输: 上传 {len(uploads)} 个，下载 {len(downloads)} 个")
+            threading.Thread(target=self._resume_transfers_thread, args=(uploads, downloads), daemon=True).start()
+
+    def _resume_transfers_thread(self, uploads, downloads):
+        """续传线程 - 上传整批并行，下载逐个从.part文件断点继续"""
+        if uploads:
+            cancel_event = self.begin_transfer()
+            try:
+                self.ui.post(lambda: self.show_progress(True))
+                jobs = [(local_path, remote_dir) for _, local_path, remote_dir in uploads]
+                journal_ids = [entry_id for entry_id, _, _ in uploads]
+                batch = self._run_upload_batch(jobs, jobs[0][1], self.get_upload_parallelism(),
+                                               cancel_event, journal_ids)
+                self.ui.post(lambda: self._on_upload_batch_done(batch))
+            except Exception as e:
+                error_msg = str(e)
+                self.ui.post(lambda: self._on_upload_error(error_msg))
+            finally:
+                self.end_transfer(cancel_event)
+                
+        if downloads:
+            # 续传的下载逐个完成后只汇总提示一次
+            results = []
+            for entry_id, save_path, remote_path, size in downloads:
+                self._download_file_thread(remote_path, save_path, os.path.basename(save_path), entry_id, size,
+                                           results)
+            self.ui.post(lambda: self._on_resumed_downloads_done(results))
+
+    def interleave_by_size(self, jobs):
+        """按文件大小交替排列（最小、最大、次小、次大...），让小文件和大文件同时占满上传通道"""
+        def size_of(job):
+            try:
+                return os.path.getsize(job[0])
+            except OSError:
+                return 0  # 扫描后被删除或无法访问，留给上传时报告错误
+        
+        ordered = sorted(jobs, key=size_of)
+        result = []
+        low, high = 0, len(ordered) - 1
+        while low <= high:
+            result.append(ordered[low])
+            if low != high:
+                result.append(ordered[high])
+            low += 1
+            high -= 1
+        return result
+
+    def _upload_with_retry(self, file_path, dest_path, batch, cancel_event):
+        """上传单个文件，网络错误时按退避间隔重试（MD5校验失败不在这里重试），结果记入批次"""
+        filename = os.path.basename(file_path)
+        stats = None
+        try:
+            stats = TransferStats('upload', f"{dest_path.rstrip('/')}/{filename}", os.path.getsize(file_path))
+            for attempt in range(UPLOAD_RETRIES + 1):
+                if cancel_event.is_set():
+                    raise TransferCancelled("上传已取消")
+                try:
+                    self._upload_one_file(file_path, dest_path, stats, batch, cancel_event)
+                    break
+                except (TransferCancelled, NASAPIError, TransferVerifyError) as e:
+                    # 校验失败已在_upload_one_file中重传过，不再叠加网络错误的重试
+                    if isinstance(e, NASAPIError) and e.retriable and attempt < UPLOAD_RETRIES:
+                        pass
                     else:
-                        error_msg += "\n\n请点击'断开'按钮后重新登录"
-                raise Exception(error_msg)
+                        raise
+                except Exception:
+                    if cancel_event.is_set():
+                        raise TransferCancelled("上传已取消")
+                    if attempt >= UPLOAD_RETRIES:
+                        raise
                 
-            # 上传成功
-            self.root.after(0, lambda: self._on_upload_success(filename))
-            
+                # 撤销本次已计入的进度，等待后重试
+                batch.rewind(file_path)
+                stats.retry()
+                print(f"⚠ 上传 {filename} 失败，{2 ** attempt} 秒后重试 ({attempt + 1}/{UPLOAD_RETRIES})")
+                cancel_event.wait(2 ** attempt)
+            
+            self.record_transfer(stats, 'ok')
+            batch.finish_file(file_path, 'ok')
+            self.journal_finish(batch.journal_ids.get(file_path), 'ok')
+        except TransferCancelled:
+            if stats:
+                self.record_transfer(stats, 'cancelled')
+            batch.finish_file(file_path, 'cancelled')
+            self.journal_finish(batch.journal_ids.get(file_path), 'cancelled')
         except Exception as e:
-            error_msg = str(e)
-            self.root.after(0, lambda: self._on_upload_error(error_msg))
+            if stats:
+                self.record_transfer(stats, 'failed', str(e))
+            batch.finish_file(file_path, 'failed', str(e))
+            self.journal_finish(batch.journal_ids.get(file_path), 'failed')
+            print(f"⚠ 上传失败: {file_path}: {e}")
+
+    def _upload_one_file(self, file_path, dest_path, stats, batch, cancel_event):
+        """上传一个文件，开启校验时比对MD5，不一致则重新上传"""
+        filename = os.path.basename(file_path)
+        
+        def on_progress(nbytes):
+            if batch.add(file_path, nbytes):
+                self.report_batch_progress(batch)
+        
+        verify = self.verify_transfers.get()
+        attempt = 0
+        while True:
+            hasher = hashlib.md5() if verify else None
+            self._upload_once(file_path, dest_path, hasher, stats, cancel_event, on_progress)
+            if not verify:
+                return
             
-    def _on_upload_success(self, filename):
-        """上传成功回调"""
-        self.show_progress(False)
-        self.update_status(f"文件 {filename} 上传成功")
-        messagebox.showinfo("上传成功", f"文件 {filename} 已成功上传")
+            # 上传时已边读边算出本地MD5，这里只需等待NAS端结果
+            remote_path = f"{dest_path.rstrip('/')}/{filename}"
+            if self._check_transfer_md5(remote_path, hasher.hexdigest(), self.start_remote_md5(remote_path), attempt):
+                return
+            attempt += 1
+            batch.rewind(file_path)
+            stats.retry()
+
+    def report_batch_progress(self, batch):
+        """在状态栏和进度条上显示批量上传的汇总进度"""
+        stats = batch.stats
+        name = os.path.basename(batch.file_paths[0]) if batch.total_files == 1 else f"{batch.total_files} 个文件"
+        parts = [f"正在上传 {name}..."]
+        if batch.total_files > 1:
+            parts.append(f"[{batch.finished_count()}/{batch.total_files}]")
+        if stats.total_size > 0:
+            progress = min(stats.transferred / stats.total_size * 100, 100.0)
+            self.ui.post(lambda p=progress: self.progress_var.set(p), key='progress')
+            parts.append(f"{progress:.1f}% ({self.format_file_size(stats.transferred)}/{self.format_file_size(stats.total_size)})")
+        if stats.speed > 0:
+            parts.append(f"{self.format_file_size(stats.speed)}/s")
+        eta = stats.eta()
+        if eta is not None:
+            parts.append(f"剩余 {self.format_duration(eta)}")
+        message = ' '.join(parts)
+        self.update_status(message)
+
+    def _upload_once(self, file_path, dest_path, hasher=None, stats=None, cancel_event=None, on_progress=None):
+        """执行一次上传请求，hasher不为空时边读取边计算MD5，on_progress(字节数)用于汇报进度"""
+        filename = os.path.basename(file_path)
+        
+        # 准备上传参数
+        # 获取上传API的路径
+        upload_api_path = self.api_info.get('SYNO.FileStation.Upload', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{upload_api_path}"
+            
+        data = {
+            'api': 'SYNO.FileStation.Upload',
+            'version': self.api_version('SYNO.FileStation.Upload'),
+            'method': 'upload',
+            'path': dest_path,
+            'create_parents': 'false',
+            'overwrite': 'true'
+            # 不传_sid，使用session的cookie
+        }
         
-        # 刷新文件列表
-        self.refresh_file_list()
+        # 打开文件准备上传，请求体边读边发，不在内存中拼接整个文件
+        with open(file_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            file_size = st.st_size
+            # 保留本地修改时间（毫秒），同步时据此判断文件是否改变
+            data['mtime'] = str(int(st.st_mtime * 1000))
+            reader = TransferReader(f, hasher, self.create_transfer_throttle(), stats, on_progress)
+            body = MultipartUploadStream(data, 'file', filename, reader, file_size,
+                                         cancel_event=cancel_event)
+            
+            # 读取超时按数据停滞计算，不限制整体上传时长
+            timeout = self.timeouts.for_upload(file_size)
+            response = self.session.post(url, data=body, headers={'Content-Type': body.content_type},
+                                         timeout=timeout)
+            response.raise_for_status()
+            
+        result = response.json()
+        if not result.get('success'):
+            error_info = result.get('error', {})
+            error_code = error_info.get('code', 'unknown')
+            error_messages = {
+                119: "会话未找到，请重新登录",
+                407: "操作不被允许，请检查文件夹权限",
+                1800: "上传数据不完整",
+                1801: "上传超时",
+                1802: "文件名信息缺失",
+                1803: "上传被取消",
+                1804: "文件过大",
+                1805: "文件已存在且无法覆盖"
+            }
+            error_msg = error_messages.get(error_code, f"上传失败，错误代码: {error_code}")
+            # 会话失效时NASSession已重新登录，但上传数据流无法重放，由上传队列重试
+            raise NASAPIError(error_msg, error_code)
+            
+    def _on_upload_batch_done(self, batch):
+        """批量上传结束回调"""
+        self.hide_progress_if_idle()
+        
+        succeeded = batch.results['ok']
+        failed = batch.results['failed']
+        cancelled = batch.results['cancelled']
+        if batch.total_files == 1 and succeeded:
+            filename = os.path.basename(succeeded[0])
+            self.update_status(f"文件 {filename} 上传成功")
+            messagebox.showinfo("上传成功", f"文件 {filename} 已成功上传")
+        elif not failed:
+            summary = f"已上传 {len(succeeded)} 个文件"
+            if cancelled:
+                summary += f"，取消 {len(cancelled)} 个"
+            self.update_status(summary)
+            if succeeded:
+                messagebox.showinfo("上传完成", summary)
+        else:
+            summary = f"成功 {len(succeeded)} 个，失败 {len(failed)} 个"
+            if cancelled:
+                summary += f"，取消 {len(cancelled)} 个"
+            details = '\n'.join(f"{os.path.basename(path)}: {error}" for path, error in failed[:10])
+            if len(failed) > 10:
+                details += f"\n... 等 {len(failed)} 个文件"
+            self.update_status(f"上传结束: {summary}")
+            messagebox.showerror("上传失败", f"{summary}\n\n{details}")
+        
+        # 整批结束后只刷新一次文件列表
+        if succeeded:
+            self.refresh_file_list()
         
     def _on_upload_error(self, error_msg):
         """上传失败回调"""
-        self.show_progress(False)
+        self.hide_progress_if_idle()
         self.update_status("上传失败")
         messagebox.showerror("上传失败", error_msg)
         
-    def _download_file_thread(self, file_path, save_path, filename):
-        """下载文件线程"""
+    def _download_file_thread(self, file_path, save_path, filename, journal_id=None, expected_size=0, results=None):
+        """下载文件线程；journal_id不为空时表示从传输日志续传。
+        results不为None时不逐个提示结果，而是追加 (文件名, 结果, 错误信息) 由调用方汇总"""
+        stats = TransferStats('download', file_path)
+        resume = journal_id is not None
+        if journal_id is None:
+            journal_id = self.journal_add('download', [(save_path, file_path)])[0]
+        result = 'failed'
+        cancel_event = self.begin_transfer()
         try:
-            self.root.after(0, lambda: self.show_progress(True))
+            self.ui.post(lambda: self.show_progress(True))
             self.update_status(f"正在下载 {filename}...")
             
-            # 下载前验证并刷新会话
-            if not self.refresh_session_if_needed():
-                raise Exception("会话验证失败，请重新登录")
-            
-            # 构建下载URL
-            # 获取下载API的路径
+            # 开启校验时，NAS端MD5与下载并行计算
+            verify = self.verify_transfers.get()
+            remote_md5 = self.start_remote_md5(file_path) if verify else None
+            attempt = 0
+            while True:
+                hasher = hashlib.md5() if verify else None
+                downloaded_size = self._download_once(file_path, save_path, filename, hasher, stats, cancel_event,
+                                                      journal_id, expected_size if resume else None)
+                resume = False  # 校验失败后从头重新下载
+                if not verify:
+                    break
+                
+                self.update_status(f"正在校验 {filename}...")
+                if self._check_transfer_md5(file_path, hasher.hexdigest(), remote_md5, attempt):
+                    break
+                attempt += 1
+                stats.retry()
+                self.update_status(f"文件 {filename} 校验不一致，正在重新下载 ({attempt}/{MAX_VERIFY_RETRIES})...")
+
+            record = self.record_transfer(stats, 'ok')
+            result = 'ok'
+            print(f"✓ 下载完成: {file_path} ({self.format_file_size(downloaded_size)}, 用时 {record['duration']:.2f}s)")
+
+            # 下载成功
+            if results is None:
+                self.ui.post(lambda: self._on_download_success(filename, save_path))
+            else:
+                results.append((filename, 'ok', ''))
+
+        except TransferCancelled:
+            result = 'cancelled'
+            self.record_transfer(stats, 'cancelled')
+            if results is None:
+                self.ui.post(lambda: self._on_transfer_cancelled("下载已取消"))
+            else:
+                results.append((filename, 'cancelled', ''))
+        except Exception as e:
+            error_msg = str(e)
+            self.record_transfer(stats, 'failed', error_msg)
+            if results is None:
+                self.ui.post(lambda: self._on_download_error(error_msg))
+            else:
+                results.append((filename, 'failed', error_msg))
+        finally:
+            self.end_transfer(cancel_event)
+            self.journal_finish(journal_id, result)
+            self.transfer_journal.flush()
+            # 不再续传的任务删除残留的部分数据
+            if result != 'ok' and not (result == 'cancelled' and self.shutting_down):
+                try:
+                    os.remove(save_path + '.part')
+                except OSError:
+                    pass
+
+    def _download_once(self, file_path, save_path, filename, hasher=None, stats=None, cancel_event=None,
+                       journal_id=None, resume_size=None):
+        """执行一次下载请求，hasher不为空时边写入边计算MD5，返回文件大小
+        
+        数据先写入"保存路径.part"，完成后再改名；resume_size不为空时从已有的.part文件断点续传，
+        远程文件大小与resume_size不一致时说明文件已改变，从头下载。日志中没有记录大小（为0）时
+        无法判断文件是否已改变，也从头下载。
+        """
+        stats = stats or TransferStats('download', file_path)
+        part_path = save_path + '.part'
+        offset = 0
+        if resume_size and os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        
+        # 构建下载URL
+        # 获取下载API的路径
+        download_api_path = self.api_info.get('SYNO.FileStation.Download', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{download_api_path}"
+        params = {
+            'api': 'SYNO.FileStation.Download',
+            'version': self.api_version('SYNO.FileStation.Download'),
+            'method': 'download',
+            'path': f'["{file_path}"]',
+            'mode': 'download'
+            # 不传_sid，使用session的cookie
+        }
+        
+        # 发送下载请求，续传时只请求剩余部分
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        response = self.session.get(url, params=params, headers=headers, timeout=self.timeouts.for_download(), stream=True)
+        response.raise_for_status()
+        
+        # 检查响应类型
+        content_type = response.headers.get('content-type', '')
+        if 'application/json' in content_type:
+            # 如果返回JSON，说明出错了
+            result = response.json()
+            if not result.get('success'):
+                error_code = result.get('error', {}).get('code', 'unknown')
+                raise Exception(f"下载失败，错误代码: {error_code}")
+        
+        # 获取文件大小，续传时以Content-Range中的总大小为准
+        content_length = int(response.headers.get('content-length', 0))
+        total_size = content_length
+        if offset and response.status_code == 206:
+            total = response.headers.get('content-range', '').rsplit('/', 1)[-1]
+            total_size = int(total) if total.isdigit() else offset + content_length
+            if resume_size and total_size != resume_size:
+                # 远程文件已改变，放弃旧的部分数据
+                response.close()
+                return self._download_once(file_path, save_path, filename, hasher, stats, cancel_event, journal_id)
+        else:
+            offset = 0
+        if journal_id is not None and total_size:
+            # 立即提交，否则程序中途退出后日志里没有大小，.part文件无法续传
+            self.transfer_journal.set_size(journal_id, total_size)
+            self.transfer_journal.flush()
+        stats.total_size = total_size
+        downloaded_size = offset
+        buckets = self.create_transfer_throttle()
+        
+        if offset:
+            print(f"✓ 从 {self.format_file_size(offset)} 处继续下载 {filename}")
+            stats.resume_from(offset)
+            if hasher:
+                # 已下载部分也要计入MD5
+                with open(part_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        hasher.update(block)
+        
+        # 写入文件，分别统计等待网络、限速和写磁盘的耗时
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in stats.timed_iter(response.iter_content(chunk_size=8192)):
+                if cancel_event and cancel_event.is_set():
+                    response.close()
+                    raise TransferCancelled("下载已取消")
+                if chunk:
+                    stats.throttle(buckets, len(chunk))
+                    disk_start = time.monotonic()
+                    f.write(chunk)
+                    stats.disk_time += time.monotonic() - disk_start
+                    if hasher:
+                        hasher.update(chunk)
+                    downloaded_size += len(chunk)
+                    stats.add(len(chunk))
+                    
+                    # 更新进度
+                    if stats.should_report():
+                        self.report_transfer_progress('下载', filename, stats)
+        
+        os.replace(part_path, save_path)
+        return downloaded_size
+
+    def report_transfer_progress(self, action, filename, stats):
+        """在状态栏和进度条上显示传输进度、速度和剩余时间"""
+        parts = [f"正在{action} {filename}..."]
+        if stats.total_size > 0:
+            progress = min(stats.transferred / stats.total_size * 100, 100.0)
+            self.ui.post(lambda p=progress: self.progress_var.set(p), key='progress')
+            parts.append(f"{progress:.1f}% ({self.format_file_size(stats.transferred)}/{self.format_file_size(stats.total_size)})")
+        else:
+            # 如果无法获取文件大小，显示已传输的数据量
+            parts.append(self.format_file_size(stats.transferred))
+        if stats.speed > 0:
+            parts.append(f"{self.format_file_size(stats.speed)}/s")
+        eta = stats.eta()
+        if eta is not None:
+            parts.append(f"剩余 {self.format_duration(eta)}")
+        if stats.retries:
+            parts.append(f"重试 {stats.retries} 次")
+        message = ' '.join(parts)
+        self.update_status(message)
+
+    def record_transfer(self, stats, result, error=''):
+        """将传输结果写入历史文件，返回写入的记录"""
+        record = stats.to_record(self.nas_url.get(), result, error)
+        self.transfer_history.append(record)
+        return record
+
+    def format_duration(self, seconds):
+        """格式化时长为 时:分:秒 或 分:秒"""
+        seconds = int(seconds)
+        hours, remainder = divmod(seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        if hours:
+            return f"{hours}:{minutes:02d}:{seconds:02d}"
+        return f"{minutes:02d}:{seconds:02d}"
+
+    def start_remote_md5(self, file_path):
+        """在后台线程中启动NAS端MD5计算并轮询结果，返回Future"""
+        future = Future()
+        
+        def _run():
+            try:
+                future.set_result(self._remote_md5_task(file_path))
+            except Exception as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=_run, daemon=True).start()
+        return future
+
+    def _remote_md5_task(self, file_path, poll_interval=0.5, max_wait=3600):
+        """通过SYNO.FileStation.MD5后台任务获取NAS端文件的MD5"""
+        md5_api_path = self.api_info.get('SYNO.FileStation.MD5', {}).get('path', 'entry.cgi')
+        url = f"{self.nas_url.get()}/webapi/{md5_api_path}"
+        params = {
+            'api': 'SYNO.FileStation.MD5',
+            'version': self.api_version('SYNO.FileStation.MD5'),
+            'method': 'start',
+            'file_path': file_path
+        }
+        
+        # 启动后台任务有副作用，失败时不自动重试
+        response = self.session.get(url, params=params, timeout=self.timeouts.for_api(), idempotent=False)
+        response.raise_for_status()
+        result = response.json()
+        if not result.get('success'):
+            raise Exception(f"启动MD5计算失败: {result.get('error', {})}")
+        task_id = result['data']['taskid']
+        
+        deadline = time.time() + max_wait
+        try:
+            while True:
+                time.sleep(poll_interval)
+                status_params = {
+                    'api': 'SYNO.FileStation.MD5',
+                    'version': self.api_version('SYNO.FileStation.MD5'),
+                    'method': 'status',
+                    'taskid': task_id
+                }
+                response = self.session.get(url, params=status_params, timeout=self.timeouts.for_api())
+                response.raise_for_status()
+                self.timeouts.record(response.elapsed.total_seconds())
+                result = response.json()
+                if not result.get('success'):
+                    raise Exception(f"获取MD5结果失败: {result.get('error', {})}")
+                if result['data'].get('finished'):
+                    return result['data']['md5'].lower()
+                if time.time() > deadline:
+                    raise Exception("NAS端MD5计算超时")
+        except Exception:
+            # 出错时停止NAS端任务，避免残留
+            try:
+                stop_params = {
+                    'api': 'SYNO.FileStation.MD5',
+                    'version': self.api_version('SYNO.FileStation.MD5'),
+                    'method': 'stop',
+                    'taskid': task_id
+                }
+                self.session.get(url, params=stop_params, timeout=self.timeouts.for_api(), idempotent=False)
+            except:
+                pass
+            raise
+
+    def _check_transfer_md5(self, remote_path, local_md5, remote_md5, attempt):
+        """比较本地与NAS端MD5，不一致且重试次数用尽时抛出TransferVerifyError"""
+        try:
+            expected = remote_md5.result()
+        except Exception as e:
+            raise TransferVerifyError(f"无法获取NAS端MD5，文件未校验: {remote_path}\n{e}")
+        if local_md5 == expected:
+            print(f"✓ MD5校验通过: {remote_path} ({local_md5})")
+            return True
+        
+        print(f"⚠ MD5校验不一致: {remote_path} 本地 {local_md5}，NAS端 {expected}")
+        if attempt >= MAX_VERIFY_RETRIES:
+            raise TransferVerifyError(f"文件校验失败: {remote_path}\n本地MD5: {local_md5}\nNAS端MD5: {expected}")
+        return False
+
+    def _download_archive_thread(self, paths, target_dir):
+        """打包下载线程 - NAS端实时压缩，本地边接收边解压"""
+        remote_desc = paths[0] if len(paths) == 1 else f"{paths[0]} 等{len(paths)}项"
+        stats = TransferStats('download_archive', remote_desc)
+        cancel_event = self.begin_transfer()
+        extractor = None
+        try:
+            self.ui.post(lambda: self.show_progress(True))
+            self.update_status(f"正在打包下载 {len(paths)} 个项目...")
+
             download_api_path = self.api_info.get('SYNO.FileStation.Download', {}).get('path', 'entry.cgi')
             url = f"{self.nas_url.get()}/webapi/{download_api_path}"
             params = {
                 'api': 'SYNO.FileStation.Download',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.Download'),
                 'method': 'download',
-                'path': f'["{file_path}"]',
+                'path': json.dumps(paths, ensure_ascii=False),  # 多个路径时NAS会实时打包成ZIP
                 'mode': 'download'
                 # 不传_sid，使用session的cookie
             }
-            
-            # 发送下载请求
-            response = self.session.get(url, params=params, timeout=300, stream=True)
+
+            response = self.session.get(url, params=params, timeout=self.timeouts.for_download(), stream=True)
             response.raise_for_status()
-            
-            # 检查响应类型
+
             content_type = response.headers.get('content-type', '')
             if 'application/json' in content_type:
-                # 如果返回JSON，说明出错了
                 result = response.json()
                 if not result.get('success'):
                     error_code = result.get('error', {}).get('code', 'unknown')
                     raise Exception(f"下载失败，错误代码: {error_code}")
-            
-            # 获取文件大小
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
-            
-            # 写入文件
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        
-                        # 更新进度
-                        if total_size > 0:
-                            progress = (downloaded_size / total_size) * 100
-                            self.root.after(0, lambda p=progress: self.progress_var.set(p))
-                            # 更新状态栏显示百分比
-                            self.root.after(0, lambda p=progress, ds=downloaded_size, ts=total_size: 
-                                self.update_status(f"正在下载 {filename}... {p:.1f}% ({self.format_file_size(ds)}/{self.format_file_size(ts)})"))
-                        else:
-                            # 如果无法获取文件大小，显示已下载的数据量
-                            self.root.after(0, lambda ds=downloaded_size: 
-                                self.update_status(f"正在下载 {filename}... {self.format_file_size(ds)}"))
-                            
-            # 下载成功
-            self.root.after(0, lambda: self._on_download_success(filename, save_path))
-            
+
+            # 打包下载的大小事先未知，只显示已接收的数据量
+            extractor = StreamingZipExtractor(target_dir)
+            received_size = 0
+            buckets = self.create_transfer_throttle()
+            for chunk in stats.timed_iter(response.iter_content(chunk_size=65536)):
+                if cancel_event.is_set():
+                    response.close()
+                    raise TransferCancelled("下载已取消")
+                if chunk:
+                    stats.throttle(buckets, len(chunk))
+                    disk_start = time.monotonic()
+                    extractor.feed(chunk)
+                    stats.disk_time += time.monotonic() - disk_start
+                    received_size += len(chunk)
+                    stats.add(len(chunk))
+                    if stats.should_report():
+                        speed = f" {self.format_file_size(stats.speed)}/s" if stats.speed > 0 else ""
+                        self.update_status(f"正在打包下载... 已接收 {self.format_file_size(received_size)}，"
+                                           f"已解压 {extractor.files_extracted} 个文件{speed}")
+            extractor.close()
+
+            elapsed = self.record_transfer(stats, 'ok')['duration']
+            file_count = extractor.files_extracted
+            print(f"✓ 打包下载完成: {file_count} 个文件 ({self.format_file_size(extractor.bytes_extracted)}, "
+                  f"传输 {self.format_file_size(received_size)}, 用时 {elapsed:.2f}s, "
+                  f"{file_count / elapsed if elapsed > 0 else 0:.1f} 文件/秒)")
+
+            self.ui.post(lambda: self._on_archive_download_success(file_count, target_dir, elapsed))
+
+        except TransferCancelled:
+            self.record_transfer(stats, 'cancelled')
+            self.ui.post(lambda: self._on_transfer_cancelled("打包下载已取消"))
         except Exception as e:
             error_msg = str(e)
-            self.root.after(0, lambda: self._on_download_error(error_msg))
-            
+            self.record_transfer(stats, 'failed', error_msg)
+            self.ui.post(lambda: self._on_download_error(error_msg))
+        finally:
+            if extractor:
+                # 出错或取消时不留下解压了一半的文件
+                extractor.abort()
+            self.end_transfer(cancel_event)
+
     def _on_download_success(self, filename, save_path):
         """下载成功回调"""
-        self.show_progress(False)
-        self.progress_var.set(0)  # 重置进度条
+        self.hide_progress_if_idle()
         self.update_status(f"文件 {filename} 下载完成")
         messagebox.showinfo("下载成功", f"文件已保存到:\n{save_path}")
-        
+
+    def _on_resumed_downloads_done(self, results):
+        """续传的下载全部结束后汇总提示一次"""
+        self.hide_progress_if_idle()
+        succeeded = [filename for filename, result, error in results if result == 'ok']
+        failed = [(filename, error) for filename, result, error in results if result == 'failed']
+        cancelled = [filename for filename, result, error in results if result == 'cancelled']
+        summary = f"已续传下载 {len(succeeded)} 个文件"
+        if failed:
+            summary += f"，失败 {len(failed)} 个"
+        if cancelled:
+            summary += f"，取消 {len(cancelled)} 个"
+        self.update_status(summary)
+        if failed:
+            details = '\n'.join(f"{filename}: {error}" for filename, error in failed[:10])
+            if len(failed) > 10:
+                details += f"\n... 等 {len(failed)} 个文件"
+            messagebox.showerror("续传下载失败", f"{summary}\n\n{details}")
+        elif succeeded:
+            messagebox.showinfo("续传下载完成", summary)
+
+    def _on_archive_download_success(self, file_count, target_dir, elapsed):
+        """打包下载成功回调"""
+        self.hide_progress_if_idle()
+        self.update_status(f"打包下载完成，共 {file_count} 个文件，用时 {elapsed:.1f} 秒")
+        messagebox.showinfo("下载成功", f"{file_count} 个文件已保存到:\n{target_dir}")
+
     def _on_download_error(self, error_msg):
         """下载失败回调"""
-        self.show_progress(False)
-        self.progress_var.set(0)  # 重置进度条
+        self.hide_progress_if_idle()
         self.update_status("下载失败")
         messagebox.showerror("下载失败", error_msg)
+
+    def _on_transfer_cancelled(self, message):
+        """传输取消回调"""
+        self.hide_progress_if_idle()
+        self.update_status(message)
         
     def format_file_size(self, size_bytes):
         """格式化文件大小"""
@@ -1928,143 +5376,25 @@ class SynologyNASManager:
             i += 1
         return f"{size_bytes:.1f} {size_names[i]}"
     
-    def get_file_type_display(self, filename, is_dir=False):
-        """根据文件名获取友好的文件类型显示"""
-        if is_dir:
-            return "[文件夹]"
-        
-        # 获取文件扩展名
-        ext = os.path.splitext(filename)[1].lower()
-        
-        # 文件类型映射 - 使用简单的文本标识避免emoji兼容性问题
-        file_types = {
-            # 图片
-            '.png': '[图片] PNG',
-            '.jpg': '[图片] JPG', 
-            '.jpeg': '[图片] JPEG',
-            '.gif': '[图片] GIF',
-            '.bmp': '[图片] BMP',
-            '.svg': '[图片] SVG',
-            '.webp': '[图片] WebP',
-            '.ico': '[图片] ICO',
-            
-            # 文档
-            '.txt': '[文本] TXT',
-            '.doc': '[Word] DOC',
-            '.docx': '[Word] DOCX',
-            '.pdf': '[PDF] PDF',
-            '.xls': '[Excel] XLS',
-            '.xlsx': '[Excel] XLSX',
-            '.ppt': '[PPT] PPT',
-            '.pptx': '[PPT] PPTX',
-            '.rtf': '[文本] RTF',
-            '.odt': '[文档] ODT',
-            '.ods': '[表格] ODS',
-            '.odp': '[演示] ODP',
-            
-            # 代码和脚本
-            '.py': '[代码] Python',
-            '.js': '[代码] JavaScript',
-            '.html': '[网页] HTML',
-            '.htm': '[网页] HTM',
-            '.css': '[样式] CSS',
-            '.php': '[代码] PHP',
-            '.java': '[代码] Java',
-            '.cpp': '[代码] C++',
-            '.c': '[代码] C',
-            '.cs': '[代码] C#',
-            '.xml': '[数据] XML',
-            '.json': '[数据] JSON',
-            '.sql': '[数据库] SQL',
-            '.sh': '[脚本] Shell',
-            '.bat': '[脚本] BAT',
-            '.ps1': '[脚本] PowerShell',
-            
-            # 压缩包
-            '.zip': '[压缩] ZIP',
-            '.rar': '[压缩] RAR',
-            '.7z': '[压缩] 7Z',
-            '.tar': '[压缩] TAR',
-            '.gz': '[压缩] GZ',
-            '.bz2': '[压缩] BZ2',
-            '.xz': '[压缩] XZ',
-            
-            # 音频
-            '.mp3': '[音频] MP3',
-            '.wav': '[音频] WAV',
-            '.flac': '[音频] FLAC',
-            '.aac': '[音频] AAC',
-            '.ogg': '[音频] OGG',
-            '.wma': '[音频] WMA',
-            
-            # 视频
-            '.mp4': '[视频] MP4',
-            '.avi': '[视频] AVI',
-            '.mkv': '[视频] MKV',
-            '.mov': '[视频] MOV',
-            '.wmv': '[视频] WMV',
-            '.flv': '[视频] FLV',
-            '.webm': '[视频] WebM',
-            '.m4v': '[视频] M4V',
-            
-            # 可执行文件
-            '.exe': '[程序] EXE',
-            '.msi': '[安装] MSI',
-            '.deb': '[安装] DEB',
-            '.rpm': '[安装] RPM',
-            '.dmg': '[安装] DMG',
-            '.app': '[应用] APP',
-            
-            # 数据库
-            '.db': '[数据库] DB',
-            '.sqlite': '[数据库] SQLite',
-            '.mdb': '[数据库] MDB',
-            
-            # 配置文件
-            '.ini': '[配置] INI',
-            '.conf': '[配置] CONF',
-            '.cfg': '[配置] CFG',
-            '.yaml': '[配置] YAML',
-            '.yml': '[配置] YML',
-            '.toml': '[配置] TOML',
-            
-            # 字体
-            '.ttf': '[字体] TTF',
-            '.otf': '[字体] OTF',
-            '.woff': '[字体] WOFF',
-            '.woff2': '[字体] WOFF2',
-            
-            # 其他
-            '.iso': '[镜像] ISO',
-            '.log': '[日志] LOG',
-            '.md': '[文档] Markdown',
-            '.csv': '[数据] CSV',
-        }
-        
-        return file_types.get(ext, f'[文件] {ext[1:].upper() if ext else "未知"}')
-    
     def is_image_file(self, filename):
         """检查是否为图片文件"""
         if not filename:
             return False
         
-        ext = os.path.splitext(filename)[1].lower()
-        image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp', '.ico', '.tiff', '.tif'}
-        return ext in image_extensions
+        return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
     
     def is_video_file(self, filename):
         """检查是否为视频文件"""
         if not filename:
             return False
         
-        ext = os.path.splitext(filename)[1].lower()
-        video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.rmvb', '.mpg', '.mpeg'}
-        return ext in video_extensions
+        return os.path.splitext(filename)[1].lower() in VIDEO_EXTENSIONS
     
     def get_image_thumbnail(self, filename, view_mode):
         """获取图片缩略图"""
         if not hasattr(self, 'thumbnail_cache'):
             self.thumbnail_cache = {}
+            self.thumbnail_loading = set()
         
         # 生成缓存键
         cache_key = f"{filename}_{view_mode}"
@@ -2073,8 +5403,10 @@ class SynologyNASManager:
         if cache_key in self.thumbnail_cache:
             return self.thumbnail_cache[cache_key]
         
-        # 如果没有缓存，返回空字符串（异步加载缩略图）
-        self.load_image_thumbnail_async(filename, view_mode, cache_key)
+        # 如果没有缓存，返回空字符串（异步加载缩略图）；滚动重绘时不重复加载
+        if cache_key not in self.thumbnail_loading:
+            self.thumbnail_loading.add(cache_key)
+            self.load_image_thumbnail_async(filename, view_mode, cache_key)
         return ""
     
     def load_image_thumbnail_async(self, filename, view_mode, cache_key):
@@ -2096,13 +5428,13 @@ class SynologyNASManager:
             # 下载参数
             params = {
                 'api': 'SYNO.FileStation.Download',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.Download'),
                 'method': 'download',
                 'path': file_path
             }
             
             # 下载图片到临时文件
-            response = self.session.get(url, params=params, stream=True, timeout=10)
+            response = self.session.get(url, params=params, stream=True, timeout=self.timeouts.for_download())
             response.raise_for_status()
             
             # 创建临时文件
@@ -2125,10 +5457,12 @@ class SynologyNASManager:
             
             # 在主线程中更新缓存和UI
             if thumbnail:
-                self.root.after(0, lambda: self._update_thumbnail_cache(cache_key, thumbnail, filename))
+                self.ui.post(lambda: self._update_thumbnail_cache(cache_key, thumbnail, filename))
             
         except Exception as e:
             print(f"⚠ 加载缩略图失败 {filename}: {str(e)}")
+        finally:
+            self.ui.post(lambda: self.thumbnail_loading.discard(cache_key))
     
     def create_thumbnail(self, image_path, view_mode):
         """创建缩略图"""
@@ -2183,9 +5517,8 @@ class SynologyNASManager:
         # 更新缓存
         self.thumbnail_cache[cache_key] = thumbnail
         
-        # 刷新文件列表以显示缩略图
-        if hasattr(self, 'current_path') and self.current_path:
-            self.refresh_file_list()
+        # 重绘可见行以显示缩略图（不重新请求文件列表），同一帧内到达的缩略图只重绘一次
+        self.ui.post(lambda: self.file_view.redraw(force=True), key='file_view')
         
         print(f"✓ 缩略图加载完成: {filename}")
     
@@ -2239,14 +5572,14 @@ class SynologyNASManager:
             # 下载参数
             params = {
                 'api': 'SYNO.FileStation.Download',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.Download'),
                 'method': 'download',
                 'path': file_path
                 # 不传_sid，使用session的cookie
             }
             
             # 下载图片到临时文件
-            response = self.session.get(url, params=params, stream=True, timeout=30)
+            response = self.session.get(url, params=params, stream=True, timeout=self.timeouts.for_download())
             response.raise_for_status()
             
             # 创建临时文件
@@ -2259,11 +5592,11 @@ class SynologyNASManager:
                         temp_file.write(chunk)
             
             # 在主线程中打开预览窗口
-            self.root.after(0, lambda: self._open_preview_window(temp_path, filename))
+            self.ui.post(lambda: self._open_preview_window(temp_path, filename))
             
         except Exception as e:
             error_msg = str(e)
-            self.root.after(0, lambda: self._on_preview_error(error_msg))
+            self.ui.post(lambda: self._on_preview_error(error_msg))
     
     def _preview_video_thread(self, file_path, filename):
         """视频预览线程"""
@@ -2277,14 +5610,14 @@ class SynologyNASManager:
             # 下载参数
             params = {
                 'api': 'SYNO.FileStation.Download',
-                'version': '2',
+                'version': self.api_version('SYNO.FileStation.Download'),
                 'method': 'download',
                 'path': file_path
                 # 不传_sid，使用session的cookie
             }
             
             # 下载视频到临时文件
-            response = self.session.get(url, params=params, stream=True, timeout=60)  # 增加超时时间
+            response = self.session.get(url, params=params, stream=True, timeout=self.timeouts.for_download())
             response.raise_for_status()
             
             # 创建临时文件
@@ -2297,11 +5630,11 @@ class SynologyNASManager:
                         temp_file.write(chunk)
             
             # 在主线程中打开预览窗口
-            self.root.after(0, lambda: self._open_video_preview_window(temp_path, filename))
+            self.ui.post(lambda: self._open_video_preview_window(temp_path, filename))
             
         except Exception as e:
             error_msg = str(e)
-            self.root.after(0, lambda: self._on_video_preview_error(error_msg))
+            self.ui.post(lambda: self._on_video_preview_error(error_msg))
     
     def _open_preview_window(self, temp_path, filename):
         """打开预览窗口"""
@@ -2366,14 +5699,15 @@ class SynologyNASManager:
         messagebox.showerror("预览失败", f"无法预览视频:\n{error_msg}")
         
     def update_status(self, message):
-        """更新状态"""
+        """更新状态 - 工作线程中的多次更新每帧只显示最新的一条"""
         def _update():
             self.status_label.configure(text=message)
             
         if threading.current_thread() == threading.main_thread():
+            self.ui.discard('status')
             _update()
         else:
-            self.root.after(0, _update)
+            self.ui.post(_update, key='status')
             
     def run(self):
         """运行应用程序"""
@@ -2388,9 +5722,14 @@ class SynologyNASManager:
         # 保存当前配置
         self.save_config()
         
-        # 如果已登录，先登出
+        # 取消正在进行的传输，避免上传线程在窗口关闭后继续运行；未完成的任务保留在日志中，下次登录续传
+        self.shutting_down = True
+        self.cancel_transfers()
+        self.transfer_journal.flush()
+        
+        # 如果已登录，先登出；记住密码时保留NAS端会话，下次启动直接复用
         if self.session_id:
-            self.logout()
+            self.logout(end_session=not self.remember_password.get())
             
         self.root.destroy()
 